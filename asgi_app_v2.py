@@ -0,0 +1,199 @@
+"""
+战双角色识别系统 V2 - 异步（ASGI）版本
+提供 /api/recognize、/api/model_info 和 /metrics 接口，识别逻辑与 recognition_app_v2.py 相同
+
+上传的图片在事件循环中异步接收，慢速客户端上传期间不占用任何线程；
+检测和识别等CPU密集的工作交给线程池执行，一个进程可以同时保持大量慢连接，
+同时让CPU核心忙于推理
+
+用法:
+    python asgi_app_v2.py --bind 0.0.0.0:5000
+    uvicorn asgi_app_v2:app --host 0.0.0.0 --port 5000
+
+也可以通过环境变量配置: PGR_BIND, PGR_ASGI_THREADS
+"""
+
+import os
+import time
+import queue
+import asyncio
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import recognition_app_v2
+
+# 执行检测和识别的线程数
+ASGI_THREADS = int(os.environ.get('PGR_ASGI_THREADS', os.cpu_count() or 1))
+
+executor = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """启动时加载人脸检测器和模型，创建推理线程池"""
+    global executor
+
+    recognition_app_v2.create_app()
+    # 设置了 PGR_METRICS_DIR 时（例如 uvicorn --workers）定期写入本进程的指标
+    recognition_app_v2.metrics.start_flushing()
+    executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-inference')
+    print(f"推理线程数: {ASGI_THREADS}")
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+class UploadTooLarge(Exception):
+    """接收到的请求体超过大小限制"""
+
+
+def limit_body(request, max_length):
+    """
+    返回按实际接收的字节数限制请求体大小的Request
+    没有Content-Length的分块上传在接收过程中超限时抛出 UploadTooLarge，不会先把整个请求体暂存下来
+    """
+    receive = request.receive
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_length:
+                raise UploadTooLarge()
+        return message
+
+    return Request(request.scope, limited_receive)
+
+
+async def recognize(request):
+    """识别接口 - 使用人脸检测"""
+    # 声明的大小已经超限时不再接收请求体
+    max_length = recognition_app_v2.MAX_UPLOAD_SIZE + recognition_app_v2.MULTIPART_OVERHEAD
+    content_length = request.headers.get('content-length')
+    if content_length:
+        try:
+            content_length = int(content_length)
+        except ValueError:
+            return JSONResponse({'error': 'Content-Length格式错误'}, status_code=400)
+        if content_length > max_length:
+            return JSONResponse({'error': '图片超过10MB限制'}, status_code=413)
+
+    # 未声明大小（分块上传）或声明的大小与实际不符，按实际接收的字节数限制
+    request = limit_body(request, max_length)
+
+    try:
+        # 异步接收并解析请求体（大文件暂存到临时文件）
+        async with request.form(max_files=1) as form:
+            file = form.get('image')
+            if file is None or isinstance(file, str):
+                return JSONResponse({'error': '没有上传图片'}, status_code=400)
+            if not file.filename:
+                return JSONResponse({'error': '没有选择文件'}, status_code=400)
+
+            image_bytes = await file.read(recognition_app_v2.MAX_UPLOAD_SIZE + 1)
+        if len(image_bytes) > recognition_app_v2.MAX_UPLOAD_SIZE:
+            return JSONResponse({'error': '图片超过10MB限制'}, status_code=413)
+
+        # 带有调试请求头时在响应中返回各阶段的耗时
+        trace = None
+        if request.headers.get(recognition_app_v2.DEBUG_TIMING_HEADER) == '1':
+            trace = recognition_app_v2.RequestTrace()
+
+        result = await run_in_executor(
+            recognition_app_v2.traced, trace, recognition_app_v2.recognize_image_bytes, image_bytes
+        )
+        if trace is not None:
+            result['timing'] = trace.to_dict()
+        return JSONResponse(result)
+
+    except ClientDisconnect:
+        # 客户端在上传完成前断开，无需响应
+        return JSONResponse({'error': '上传中断'}, status_code=400)
+    except UploadTooLarge:
+        return JSONResponse({'error': '图片超过10MB限制'}, status_code=413)
+    except HTTPException as e:
+        # 表单解析失败（格式错误、文件数超过限制等）
+        return JSONResponse({'error': f'无法解析上传的表单: {e.detail}'}, status_code=e.status_code)
+    except recognition_app_v2.ImageTooLarge as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    except queue.Full:
+        return JSONResponse({'error': '服务繁忙，请稍后重试'}, status_code=503)
+    except Exception as e:
+        print(f"识别错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({'error': f'识别失败: {str(e)}'}, status_code=500)
+
+
+async def model_info(request):
+    """获取模型信息（启动时已加载到内存，客户端带有相同ETag时返回304）"""
+    loaded = recognition_app_v2.current_model()
+    if loaded.model_info_json is None:
+        return JSONResponse({'error': f'未找到 {recognition_app_v2.MODEL_INFO_PATH}'}, status_code=500)
+
+    etag = f'"{loaded.model_info_etag}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    return Response(loaded.model_info_json, media_type='application/json', headers=headers)
+
+
+async def metrics(request):
+    """Prometheus格式的运行指标"""
+    return Response(recognition_app_v2.metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+def recorded(endpoint, handler):
+    """记录接口的请求耗时和状态码（与Flask版本使用同一组指标）"""
+    async def wrapper(request):
+        started = time.perf_counter()
+        response = await handler(request)
+        recognition_app_v2.record_request(endpoint, response.status_code, time.perf_counter() - started)
+        return response
+    return wrapper
+
+
+app = Starlette(
+    routes=[
+        Route('/api/recognize', recorded('recognize', recognize), methods=['POST']),
+        Route('/api/model_info', recorded('model_info', model_info)),
+        Route('/metrics', metrics),
+    ],
+    lifespan=lifespan
+)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='战双角色识别系统 V2 异步服务器')
+    parser.add_argument('--bind', default=os.environ.get('PGR_BIND', '0.0.0.0:5000'),
+                        help='监听地址')
+    args = parser.parse_args()
+    host, port = args.bind.rsplit(':', 1)
+
+    print("=" * 60)
+    print("战双角色识别系统 V2 - 异步版本")
+    print("=" * 60)
+    print(f"监听地址: {args.bind}")
+
+    uvicorn.run(app, host=host, port=int(port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+动态微批处理调度器
+将多个并发请求提交的图片合并成一个批次，统一做一次前向传播，
+再把结果按请求拆分返回
+"""
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class InferenceBatcher:
+    """
+    在后台线程中收集并发请求，凑满 max_batch_size 张图片或等待超过
+    max_wait_ms 毫秒后调用一次 run_batch
+
+    run_batch: 接收图片列表，返回与之一一对应的结果列表
+    max_queue_size: 等待中的请求数上限，队列满时 submit 阻塞（0表示不限制）
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0, max_queue_size=0):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(max_queue_size)
+        self._thread = None
+        self._pid = None
+
+    def submit(self, items):
+        """提交一组图片，返回 Future，结果为与 items 一一对应的列表"""
+        future = Future()
+        if len(items) == 0:
+            future.set_result([])
+            return future
+
+        self._ensure_started()
+        self._queue.put((list(items), future))
+        return future
+
+    def predict(self, items, timeout=None):
+        """提交并等待结果"""
+        return self.submit(items).result(timeout)
+
+    def _ensure_started(self):
+        """按需启动后台线程（fork之后子进程中没有该线程，需要重新启动）"""
+        pid = os.getpid()
+        if self._pid == pid and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue(self.max_queue_size)
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._loop, args=(self._queue,),
+                name='inference-batcher', daemon=True
+            )
+            self._thread.start()
+
+    @staticmethod
+    def _next_request(pending_queue, carried, timeout=None):
+        """优先取上一轮放不下的请求，否则从队列中取"""
+        if carried:
+            return carried.popleft()
+        return pending_queue.get(timeout=timeout)
+
+    def _collect(self, pending_queue, carried):
+        """收集一个批次的请求，直到批次已满或等待超时"""
+        first = self._next_request(pending_queue, carried)
+        batch = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._next_request(pending_queue, carried, remaining)
+            except queue.Empty:
+                break
+
+            # 放不下的请求留给下一个批次（单个请求本身超过上限时单独成批）
+            if count + len(request[0]) > self.max_batch_size:
+                carried.appendleft(request)
+                break
+
+            batch.append(request)
+            count += len(request[0])
+
+        return batch
+
+    def _loop(self, pending_queue):
+        """后台线程：循环收集批次并执行"""
+        carried = deque()
+
+        while True:
+            batch = self._collect(pending_queue, carried)
+            items = [item for request_items, _ in batch for item in request_items]
+
+            try:
+                results = self.run_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_items, future in batch:
+                future.set_result(results[offset:offset + len(request_items)])
+                offset += len(request_items)
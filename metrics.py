@@ -0,0 +1,321 @@
+"""
+运行指标
+计数器和直方图，以Prometheus文本格式输出（不依赖prometheus_client）
+
+另有请求级的计时记录（RequestTrace）：处理阶段用 timed_stage 计时，
+耗时同时记入直方图和当前线程正在记录的请求，用于在响应中返回单个请求的耗时明细
+
+指标在每个进程中单独统计。多进程部署（gunicorn的多个worker）时指定共享目录，
+各进程定期把自己的指标写入其中的 metrics_<pid>.json，任一进程输出时合并所有进程的结果：
+计数器和直方图按所有进程（包括已退出的）求和，gauge只合计仍在运行的进程
+启动和切换模型时的预热在 unrecorded() 中执行，不计入指标
+"""
+
+import os
+import glob
+import json
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+
+# 耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 各线程正在记录的请求，以及是否暂停记录指标
+_local = threading.local()
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if not recording():
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """按分桶统计观测值的分布（同时记录总和与次数）"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        if not recording():
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', dict(labels, le=format_value(float(bound))), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+def clear_directory(directory):
+    """删除目录中之前运行留下的指标文件（多进程部署启动时、fork出worker之前调用）"""
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        os.remove(path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    collector: 输出时调用的函数，返回 [(名称, 类型, 说明, [(标签, 值), ...]), ...]，
+    用于缓存命中数、队列长度等由其他组件维护的数值
+    directory: 多进程部署时各进程共享的指标目录（None表示只输出当前进程的指标）
+    flush_interval: 写入指标文件的间隔（秒）
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self._metrics = []
+        self._collectors = []
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        """当前进程的指标: [(名称, 类型, 说明, [(样本名称, 标签, 值), ...]), ...]"""
+        families = []
+        for metric in self._metrics:
+            families.append((metric.name, metric.type_name, metric.documentation, list(metric.samples())))
+
+        for collector in self._collectors:
+            for name, type_name, documentation, samples in collector():
+                families.append((name, type_name, documentation, [(name, labels, value) for labels, value in samples]))
+
+        return families
+
+    def render(self):
+        """Prometheus文本格式（指定了共享目录时为所有进程合计的结果）"""
+        families = self.collect()
+        if self.directory is not None:
+            self.start_flushing()
+            self.flush(families)
+            families = self.merge_directory()
+
+        lines = []
+        for name, type_name, documentation, samples in families:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {type_name}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{format_labels(labels)} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def flush(self, families=None):
+        """把当前进程的指标写入共享目录（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+        if self.directory is None:
+            return
+        if families is None:
+            families = self.collect()
+
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+        with self._flush_lock:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(families, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+
+    def merge_directory(self):
+        """合并共享目录中所有进程的指标"""
+        merged = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, 'metrics_*.json'))):
+            pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    families = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = process_alive(pid)
+
+            for name, type_name, documentation, samples in families:
+                # 已退出进程的gauge（队列长度、模型版本等）不再有意义
+                if type_name == 'gauge' and not alive:
+                    continue
+                _, _, values = merged.setdefault(name, (type_name, documentation, {}))
+                for sample_name, labels, value in samples:
+                    key = (sample_name, tuple(labels.items()))
+                    values[key] = values.get(key, 0) + value
+
+        return [
+            (name, type_name, documentation,
+             [(sample_name, dict(labels), value) for (sample_name, labels), value in values.items()])
+            for name, (type_name, documentation, values) in merged.items()
+        ]
+
+    def start_flushing(self):
+        """
+        按需启动定期写入指标文件的线程（未指定共享目录时不启动）
+        fork之后子进程中没有该线程，需要在各worker中重新启动；不要在fork之前的主进程中调用
+        """
+        pid = os.getpid()
+        if self.directory is None or self._flusher_pid == pid:
+            return
+
+        with self._flush_lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+        # 退出前写入最后一次，已退出进程的计数仍计入合计
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"写入指标文件失败: {e}")
+
+
+class RequestTrace:
+    """
+    单个请求在各阶段的累计耗时（秒）
+    同一阶段多次执行时累加（例如多张图片、多个批次），在多个线程中并行执行的阶段耗时之和可能超过总耗时
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def merge(self, other):
+        for stage, seconds in list(other.stages.items()):
+            self.add(stage, seconds)
+
+    def to_dict(self):
+        """耗时明细（毫秒）"""
+        with self._lock:
+            stages = dict(self.stages)
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'stages_ms': {stage: seconds * 1000 for stage, seconds in stages.items()}
+        }
+
+
+def recording():
+    """当前线程是否记录指标"""
+    return not getattr(_local, 'unrecorded', False)
+
+
+@contextmanager
+def unrecorded():
+    """在当前线程中暂停记录指标（用于预热等不属于请求的处理）"""
+    previous = getattr(_local, 'unrecorded', False)
+    _local.unrecorded = True
+    try:
+        yield
+    finally:
+        _local.unrecorded = previous
+
+
+def current_trace():
+    """当前线程正在记录的请求（没有时返回None）"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def tracing(trace):
+    """在当前线程中记录指定请求的阶段耗时（trace为None时不记录）"""
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def timed_stage(histogram, stage):
+    """为一个处理阶段计时：记入直方图（stage标签）和当前请求"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        histogram.observe(seconds, stage=stage)
+        trace = current_trace()
+        if trace is not None:
+            trace.add(stage, seconds)
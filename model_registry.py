@@ -0,0 +1,145 @@
+"""
+可热更新的模型注册表
+保存当前使用的模型版本（加载后不再修改的快照），新版本在后台线程中加载并预热，
+完成后原子地替换当前版本。请求开始时取一次当前版本并一直使用到结束，
+替换期间正在处理的请求仍然在旧版本上完成，旧版本在不再被引用后释放。
+
+可以通过 reload() 手动触发，也可以轮询模型文件的修改时间自动重新加载。
+"""
+
+import os
+import time
+import threading
+
+
+class ModelRegistry:
+    """
+    load: 无参数，加载并预热一个新的模型版本，返回快照对象（需要有 version 属性）
+    watch_paths: 轮询这些文件的修改时间，变化并稳定后自动重新加载
+    poll_interval: 轮询间隔（秒），0表示不轮询
+    """
+
+    def __init__(self, load, watch_paths=(), poll_interval=0):
+        self.load = load
+        self.watch_paths = list(watch_paths)
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._current = None
+        self._reloading = False
+        self._reload_done = threading.Event()
+        self._reload_done.set()
+        self._watcher = None
+        self._pid = None
+        self._loaded_mtimes = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.last_error = None
+
+    def current(self):
+        """当前模型版本的快照"""
+        if self.poll_interval > 0:
+            self._ensure_watching()
+        return self._current
+
+    def load_initial(self):
+        """同步加载第一个版本（启动时调用，失败时直接抛出异常）"""
+        mtimes = self._mtimes()
+        self._swap(self.load(), mtimes)
+        return self._current
+
+    def reload(self, wait=False, timeout=None):
+        """
+        在后台线程中加载新版本，完成后替换当前版本
+        已经在加载中时不会重复加载
+        wait: 是否等待加载完成
+        返回: 是否启动了新的加载
+        """
+        with self._lock:
+            started = not self._reloading
+            if started:
+                self._reloading = True
+                self._reload_done.clear()
+                threading.Thread(target=self._reload, name='model-reload', daemon=True).start()
+
+        if wait:
+            self._reload_done.wait(timeout)
+        return started
+
+    def status(self):
+        """当前版本和重新加载的状态"""
+        current = self._current
+        return {
+            'version': current.version if current is not None else None,
+            'loaded_at': self.loaded_at,
+            'reloading': self._reloading,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'watching': self.poll_interval > 0
+        }
+
+    def _reload(self):
+        mtimes = self._mtimes()
+        try:
+            snapshot = self.load()
+        except Exception as e:
+            # 加载失败时继续使用旧版本
+            print(f"模型重新加载失败，继续使用 {self._current.version}: {e}")
+            self.last_error = str(e)
+            self._loaded_mtimes = mtimes
+        else:
+            previous = self._current
+            self._swap(snapshot, mtimes)
+            self.reloads += 1
+            print(f"模型已切换: {previous.version} -> {snapshot.version}")
+        finally:
+            with self._lock:
+                self._reloading = False
+                self._reload_done.set()
+
+    def _swap(self, snapshot, mtimes):
+        self._current = snapshot
+        self._loaded_mtimes = mtimes
+        self.loaded_at = time.time()
+        self.last_error = None
+
+    def _mtimes(self):
+        """各监视文件的修改时间（文件不存在时为None）"""
+        mtimes = []
+        for path in self.watch_paths:
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def _ensure_watching(self):
+        """按需启动轮询线程（fork之后子进程中没有该线程，需要重新启动）"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # 父进程中正在进行的加载不会在子进程中完成
+                self._reloading = False
+                self._reload_done.set()
+            self._pid = pid
+            self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        """轮询线程：文件修改时间变化后，等到连续两次轮询结果相同（文件已写完）再重新加载"""
+        last_seen = None
+        while True:
+            time.sleep(self.poll_interval)
+            mtimes = self._mtimes()
+            if mtimes == self._loaded_mtimes:
+                last_seen = None
+                continue
+            if mtimes == last_seen:
+                self.reload()
+                last_seen = None
+            else:
+                last_seen = mtimes
@@ -20,10 +20,11 @@ model = None
 class_names = None
 device = None
 transform = None
+display_names = {}
 
 def load_model():
     """加载训练好的模型"""
-    global model, class_names, device, transform
+    global model, class_names, device, transform, display_names
     
     # 设置设备
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -34,6 +35,11 @@ def load_model():
         class_names = json.load(f)
     print(f"加载了 {len(class_names)} 个类别")
     
+    # 加载显示名称
+    if os.path.exists('models/display_names.json'):
+        with open('models/display_names.json', 'r', encoding='utf-8') as f:
+            display_names = json.load(f)
+    
     # 加载模型
     model = models.resnet18(pretrained=False)
     num_features = model.fc.in_features
@@ -57,28 +63,7 @@ def load_model():
 
 def get_character_display_name(class_name):
     """将类别名称转换为显示名称"""
-    name_mapping = {
-        '21hao': '21号',
-        'aerfa': '阿尔法',
-        'aila': '艾拉',
-        'bianka': '比安卡',
-        'dubian': '渡边',
-        'kaleinina': '卡列尼娜',
-        'kuluomu': '库洛姆',
-        'lee': '里',
-        'lifu': '丽芙',
-        'luna': '露娜',
-        'luosaita': '罗塞塔',
-        'luxiya': '露西亚',
-        'nuoan': '诺安',
-        'qishi': '七实',
-        'qu': '曲',
-        'sailinna': '赛琳娜',
-        'shenwei': '神威',
-        'wanshi': '万事',
-        'weila': '薇拉'
-    }
-    return name_mapping.get(class_name, class_name)
+    return display_names.get(class_name, class_name)
 
 def predict_image(image):
     """预测图片中的角色"""
@@ -2,35 +2,276 @@
 战双角色识别Web应用 V2
 使用人脸检测 + 角色识别的两阶段方案
 """
+import time
+# 记录导入耗时（启动耗时统计的一部分）
+import_started = time.perf_counter()
+
 import os
+
+# BLAS/OpenMP的线程数只能在加载numpy和torch之前通过环境变量设置
+if os.environ.get('PGR_BLAS_THREADS'):
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(name, os.environ['PGR_BLAS_THREADS'])
+
 import json
-from flask import Flask, render_template, request, jsonify
-from PIL import Image, ImageDraw
+from flask import Flask, Response, g, render_template, request, jsonify
+from PIL import Image
 import torch
 import torch.nn as nn
-from torchvision import models, transforms
 import io
-import base64
+import hashlib
+import hmac
+import zipfile
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 
+from inference_batcher import InferenceBatcher
+from recognition_pipeline import RecognitionPipeline
+from model_registry import ModelRegistry
+from result_cache import ResultCache, PerceptualIndex, content_key, dhash
+from metrics import MetricsRegistry, RequestTrace, current_trace, timed_stage, tracing, unrecorded
+
+# torchvision导入很慢（约占导入总耗时的一半），只在需要时才导入：
+# 从 best_model.pth 构建模型结构（build_model）和未开启融合预处理时的transform（get_transform）
+
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB限制
+
+# 启动各阶段的耗时（秒）
+startup_timings = {'import': time.perf_counter() - import_started}
+
+# 单张图片上传大小限制
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB限制
+# 批量识别接口的请求大小限制（Flask的全局限制按此设置，单图接口另行检查）
+BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('PGR_BATCH_MAX_MB', 200)) * 1024 * 1024
+# 批量识别接口单次最多处理的图片数
+BATCH_MAX_IMAGES = int(os.environ.get('PGR_BATCH_MAX_IMAGES', 64))
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_UPLOAD_SIZE, BATCH_MAX_CONTENT_LENGTH)
+# 请求体中除图片外multipart表单的开销上限（单图接口按声明的请求大小提前拒绝）
+MULTIPART_OVERHEAD = 64 * 1024
 
 # 全局变量
-model = None
-class_names = None
+# 当前使用的模型版本（模型、类别名称和元数据）由注册表管理，可以热更新
+model_registry = None
 device = None
 transform = None
 face_cascade = None
+# CascadeClassifier不是线程安全的，每个线程使用自己的实例
+cascade_local = threading.local()
+batcher = None
+result_cache = None
+near_duplicate_index = None
+detection_pool = None
+detection_pool_pid = None
+detection_pool_lock = threading.Lock()
+pipeline = None
+# 是否在gunicorn主进程中预加载（fork之前不执行前向传播，预热留到各worker中进行）
+preloading = False
+
+# 模型文件路径
+MODEL_PATH = 'models/best_model.pth'
+# 类别名称、显示名称和模型信息
+CLASS_NAMES_PATH = 'models/class_names.json'
+DISPLAY_NAMES_PATH = 'models/display_names.json'
+MODEL_INFO_PATH = 'models/model_info.json'
+# 导出的TorchScript模型（由 train_classification_model.py 或 scripts/export_model.py 生成），存在时优先加载
+TORCHSCRIPT_MODEL_PATH = 'models/best_model.torchscript.pt'
+
+# 导出的ONNX模型，推理后端为 'onnx' 时使用
+ONNX_MODEL_PATH = 'models/best_model.onnx'
+
+# INT8量化模型（由 scripts/quantize_model.py 生成），推理后端为 'int8' 时使用
+QUANTIZED_MODEL_PATH = 'models/best_model_int8.torchscript.pt'
+
+# 模型文件变化时自动重新加载的轮询间隔（秒），0表示只能通过管理接口重新加载
+MODEL_WATCH_INTERVAL = float(os.environ.get('PGR_MODEL_WATCH_INTERVAL', 0))
+# 管理接口（重新加载模型等）的访问令牌，未设置时关闭管理接口
+ADMIN_TOKEN = os.environ.get('PGR_ADMIN_TOKEN')
+
+# 推理后端: 'torch'（PyTorch）、'onnx'（ONNX Runtime，仅CPU）或 'int8'（INT8量化模型，仅CPU）
+INFERENCE_BACKEND = os.environ.get('PGR_BACKEND', 'torch')
+
+# 单次前向传播的最大批次大小
+MAX_BATCH_SIZE = int(os.environ.get('PGR_MAX_BATCH_SIZE', 32))
+
+# 跨请求微批处理：开启后并发请求的人脸区域会合并成一个批次识别
+MICRO_BATCHING = os.environ.get('PGR_MICRO_BATCHING', '0') == '1'
+# 微批处理凑批次时最多等待的时间（毫秒）
+MAX_BATCH_WAIT_MS = float(os.environ.get('PGR_MAX_BATCH_WAIT_MS', 5))
+
+# 每个进程中torch（前向传播）和OpenCV（人脸检测）使用的线程数，0表示按该进程可用的核数
+# （单进程时为全部核；serve_v2.py 多worker部署时为平均分给每个worker的核数，避免各worker都使用全部核）
+TORCH_THREADS = int(os.environ.get('PGR_TORCH_THREADS', 0))
+OPENCV_THREADS = int(os.environ.get('PGR_OPENCV_THREADS', 0))
+# 绑定CPU核，例如 '0-3'；多worker部署时可用 ';' 为各worker分别指定（如 '0-1;2-3'，按worker序号轮流使用），
+# 'auto' 表示把可用的核平均分给各worker；留空表示不绑定
+CPU_AFFINITY = os.environ.get('PGR_CPU_AFFINITY', '')
+# 启动时进程可用的CPU核（绑定之前）
+AVAILABLE_CPUS = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+
+# 批量识别时并行检测的线程数（流水线模式下为检测阶段的线程数）
+DETECTION_THREADS = int(os.environ.get('PGR_DETECTION_THREADS', min(4, os.cpu_count() or 1)))
+
+# 识别流水线：开启后解码、检测、识别分别在后台线程中运行，识别阶段跨请求合批
+PIPELINE = os.environ.get('PGR_PIPELINE', '0') == '1'
+# 流水线解码阶段的线程数
+PIPELINE_DECODE_THREADS = int(os.environ.get('PGR_DECODE_THREADS', 2))
+# 流水线各阶段之间队列的容量
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PGR_PIPELINE_QUEUE_SIZE', 64))
+# 流水线队列已满时请求最多等待的时间（秒），超时返回503
+PIPELINE_SUBMIT_TIMEOUT = float(os.environ.get('PGR_PIPELINE_SUBMIT_TIMEOUT', 5))
+
+# 加载和切换模型时预热的批次大小（逗号分隔，留空表示不预热）
+# 默认预热单张；开启微批处理或流水线时同时预热最大批次
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.environ.get(
+        'PGR_WARMUP_BATCH_SIZES', f'1,{MAX_BATCH_SIZE}' if MICRO_BATCHING or PIPELINE else '1'
+    ).split(',') if size.strip()
+]
+
+# 结果缓存：以图片内容哈希 + 模型版本为键（条目数为0时关闭）
+RESULT_CACHE_SIZE = int(os.environ.get('PGR_CACHE_SIZE', 1024))
+# 缓存条目有效期（秒），0表示不过期
+RESULT_CACHE_TTL = float(os.environ.get('PGR_CACHE_TTL', 3600))
+# 磁盘缓存（SQLite）路径，设置后缓存在重启后仍然有效，多个worker进程共享
+RESULT_CACHE_PATH = os.environ.get('PGR_CACHE_PATH')
+
+# 近似重复图片索引（感知哈希）：重新编码/缩放/轻微裁剪的同一张图片复用检测结果（条目数为0时关闭）
+NEAR_DUPLICATE_INDEX_SIZE = int(os.environ.get('PGR_NEAR_DUPLICATE_SIZE', 0))
+# 认为是同一张图片的最大汉明距离（64位dHash）
+NEAR_DUPLICATE_THRESHOLD = int(os.environ.get('PGR_NEAR_DUPLICATE_THRESHOLD', 4))
+
+# 图像预处理参数（与训练时的验证集预处理一致）
+RESIZE_SIZE = 256
+CROP_SIZE = 224
+NORMALIZE_MEAN = [0.485, 0.456, 0.406]
+NORMALIZE_STD = [0.229, 0.224, 0.225]
+# 融合预处理使用的常量: (x - mean * 255) * (1 / (std * 255))
+NORMALIZE_MEAN_255 = (np.array(NORMALIZE_MEAN, dtype=np.float32) * 255).reshape(3, 1, 1)
+NORMALIZE_SCALE = (1.0 / (np.array(NORMALIZE_STD, dtype=np.float32) * 255)).reshape(3, 1, 1)
+
+# 融合预处理：直接从原图数组缩放裁剪区域并原地归一化（关闭时使用torchvision的transform）
+FUSED_PREPROCESS = os.environ.get('PGR_FUSED_PREPROCESS', '1') == '1'
+
+# Haar Cascade人脸检测器
+FACE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# 人脸检测参数组合（多个尺度参数以提高检测率）
+DETECTION_PARAMS = [
+    {'scaleFactor': 1.1, 'minNeighbors': 3, 'minSize': (30, 30)},
+    {'scaleFactor': 1.05, 'minNeighbors': 3, 'minSize': (20, 20)},
+    {'scaleFactor': 1.2, 'minNeighbors': 5, 'minSize': (40, 40)},
+]
+
+# 人脸检测模式: 'multi_pass'（每组参数各扫描一次）或 'single_pass'（共享一次扫描）
+DETECTION_MODE = os.environ.get('PGR_DETECTION_MODE', 'multi_pass')
+
+# 检测工作分辨率：长边超过该值时先缩小再检测，检测框再映射回原图（0表示不缩放）
+DETECTION_MAX_SIDE = int(os.environ.get('PGR_DETECTION_MAX_SIDE', 1280))
+
+# 允许的最大图片像素数：解码前按图片头中的尺寸检查，防止很小的文件解码出巨大的图片（解压炸弹）
+MAX_IMAGE_PIXELS = int(os.environ.get('PGR_MAX_IMAGE_PIXELS', 40_000_000))
+
+# 较大的JPEG直接按1/2、1/4、1/8缩小解码（draft模式）到不小于检测工作分辨率，
+# 人脸区域在缩小的图片上像素不够时再按原分辨率解码截取
+DRAFT_DECODE = os.environ.get('PGR_DRAFT_DECODE', '1') == '1'
+
+# 请求头中带有 X-PGR-Debug-Timing: 1 时，识别接口的响应中包含该请求各阶段的耗时
+DEBUG_TIMING_HEADER = 'X-PGR-Debug-Timing'
+
+# 多进程部署时各进程的指标写入该目录，/metrics 输出所有进程合计的结果（serve_v2.py 自动设置）
+METRICS_DIR = os.environ.get('PGR_METRICS_DIR') or None
+# 各进程写入指标文件的间隔（秒）
+METRICS_FLUSH_INTERVAL = float(os.environ.get('PGR_METRICS_FLUSH_INTERVAL', 1))
+
+# 运行指标（GET /metrics，Prometheus文本格式）
+metrics = MetricsRegistry(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+stage_seconds = metrics.histogram(
+    'pgr_stage_duration_seconds', '各处理阶段的耗时（秒）', ['stage'])
+request_seconds = metrics.histogram(
+    'pgr_request_duration_seconds', '接口请求的处理耗时（秒）', ['endpoint'])
+requests_total = metrics.counter(
+    'pgr_requests_total', '接口请求数', ['endpoint', 'status'])
+images_total = metrics.counter(
+    'pgr_images_total', '执行人脸检测的图片数')
+fallback_total = metrics.counter(
+    'pgr_fallback_total', '未检测到人脸、使用整张图片识别的图片数')
+faces_per_image = metrics.histogram(
+    'pgr_faces_per_image', '每张图片检测到的人脸数', buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 32))
+batch_size_histogram = metrics.histogram(
+    'pgr_batch_size', '每次前向传播的批次大小', buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+def stage(name):
+    """为一个处理阶段计时（记入 pgr_stage_duration_seconds 和当前请求的耗时明细）"""
+    return timed_stage(stage_seconds, name)
+
+def traced(trace, func, *args):
+    """在当前线程中执行func，期间的阶段耗时记入trace（流水线和异步版本中各阶段在其他线程中执行）"""
+    with tracing(trace):
+        return func(*args)
+
+def record_request(endpoint, status, seconds):
+    """记录一次接口请求的耗时和状态码"""
+    request_seconds.observe(seconds, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=status)
+
+def parse_cpu_list(spec):
+    """解析CPU核列表，例如 '0-3,6' -> [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def worker_cpus(slot, workers):
+    """第slot个worker（共workers个）绑定的CPU核，None表示不绑定"""
+    if not CPU_AFFINITY:
+        return None
+    if CPU_AFFINITY == 'auto':
+        per_worker = max(1, len(AVAILABLE_CPUS) // workers)
+        start = (slot * per_worker) % len(AVAILABLE_CPUS)
+        return AVAILABLE_CPUS[start:start + per_worker]
+    cpu_sets = CPU_AFFINITY.split(';')
+    return parse_cpu_list(cpu_sets[slot % len(cpu_sets)])
+
+def configure_worker(slot=0, workers=1):
+    """
+    设置当前进程的CPU绑定和torch、OpenCV的线程数（单进程启动时，或gunicorn的每个worker启动后调用一次；
+    gunicorn主进程中不调用）
+    未指定线程数时使用该进程分到的核数
+    返回: 实际使用的配置
+    """
+    cpus = worker_cpus(slot, workers)
+    if cpus is not None:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        else:
+            print("当前系统不支持绑定CPU核，忽略 PGR_CPU_AFFINITY")
+            cpus = None
+    
+    cores = len(cpus) if cpus is not None else max(1, len(AVAILABLE_CPUS) // workers)
+    torch_threads = TORCH_THREADS or cores
+    opencv_threads = OPENCV_THREADS or cores
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(opencv_threads)
+    
+    return {'cpus': cpus, 'torch_threads': torch_threads, 'opencv_threads': opencv_threads}
 
 def load_face_detector():
     """加载人脸检测器"""
     global face_cascade
     
     # 使用OpenCV的Haar Cascade人脸检测器
-    cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-    face_cascade = cv2.CascadeClassifier(cascade_path)
+    face_cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+    cascade_local.cascade = face_cascade
     
     # 也加载动漫人脸检测器（如果可用）
     anime_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_alt.xml'
@@ -40,95 +281,204 @@ def load_face_detector():
     print("人脸检测器加载成功！")
     return True
 
-def detect_faces(image):
+def get_face_cascade():
+    """
+    获取当前线程的人脸检测器
+    同一个CascadeClassifier在多个线程中同时调用detectMultiScale会崩溃，
+    加载检测器的线程直接使用face_cascade，其他线程第一次调用时各自加载一份
+    """
+    cascade = getattr(cascade_local, 'cascade', None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+        cascade_local.cascade = cascade
+    return cascade
+
+def detect_faces(image, mode=None, img_array=None, fallback=True):
     """
     检测图片中的人脸
+    mode: 'multi_pass' 或 'single_pass'（None表示使用DETECTION_MODE）
+    img_array: 已转换好的图片数组（None表示由image转换）
+    fallback: 未检测到人脸时是否返回整张图片
     返回: [(x, y, w, h, confidence), ...]
     """
-    global face_cascade
+    with stage('grayscale'):
+        # 转换为OpenCV格式
+        if img_array is None:
+            img_array = np.array(image)
+        if len(img_array.shape) == 3 and img_array.shape[2] == 3:
+            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+        else:
+            gray = img_array
+        
+        # 缩小到检测工作分辨率（minSize只有20-40像素，原图分辨率大部分是浪费）
+        scale = detection_scale(image.width, image.height)
+        if scale < 1.0:
+            gray = cv2.resize(
+                gray,
+                (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                interpolation=cv2.INTER_AREA
+            )
     
-    # 转换为OpenCV格式
-    img_array = np.array(image)
-    if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-        gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    # 检测人脸 - 使用多个尺度参数以提高检测率
+    mode = mode or DETECTION_MODE
+    if mode == 'single_pass':
+        detected_groups = detect_single_pass(gray)
+    elif mode == 'multi_pass':
+        detected_groups = detect_multi_pass(gray)
     else:
-        gray = img_array
+        raise ValueError(f"未知的检测模式: {mode}")
     
-    # 检测人脸 - 使用多个尺度参数以提高检测率
     faces = []
-    
-    # 尝试不同的参数组合
-    params = [
-        {'scaleFactor': 1.1, 'minNeighbors': 3, 'minSize': (30, 30)},
-        {'scaleFactor': 1.05, 'minNeighbors': 3, 'minSize': (20, 20)},
-        {'scaleFactor': 1.2, 'minNeighbors': 5, 'minSize': (40, 40)},
-    ]
-    
-    for param in params:
-        detected = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=param['scaleFactor'],
-            minNeighbors=param['minNeighbors'],
-            minSize=param['minSize']
-        )
-        
-        for (x, y, w, h) in detected:
+    for detected in detected_groups:
+        for box in detected:
+            # 映射回原图坐标
+            x, y, w, h = remap_box(box, scale, image.width, image.height)
             # 计算置信度（基于检测框大小）
             confidence = min(1.0, (w * h) / (image.width * image.height * 0.5))
             faces.append((x, y, w, h, confidence))
     
     # 去重（合并重叠的检测框）
-    faces = merge_overlapping_boxes(faces)
+    with stage('nms'):
+        faces = merge_overlapping_boxes(faces)
+    
+    images_total.inc()
+    faces_per_image.observe(len(faces))
     
     # 如果没有检测到人脸，返回整张图片
-    if len(faces) == 0:
+    if len(faces) == 0 and fallback:
+        fallback_total.inc()
         print("未检测到人脸，使用整张图片")
         return [(0, 0, image.width, image.height, 0.5)]
     
     print(f"检测到 {len(faces)} 个人脸区域")
     return faces
 
+def detection_scale(width, height):
+    """计算检测工作分辨率相对原图的缩放比例（不放大）"""
+    if DETECTION_MAX_SIDE <= 0:
+        return 1.0
+    return min(1.0, DETECTION_MAX_SIDE / max(width, height))
+
+def remap_box(box, scale, img_width, img_height):
+    """将工作分辨率下的检测框映射回原图坐标"""
+    x, y, w, h = box
+    if scale >= 1.0:
+        return int(x), int(y), int(w), int(h)
+    
+    x = min(img_width - 1, int(round(x / scale)))
+    y = min(img_height - 1, int(round(y / scale)))
+    w = min(img_width - x, int(round(w / scale)))
+    h = min(img_height - y, int(round(h / scale)))
+    return x, y, w, h
+
+def detect_multi_pass(gray):
+    """
+    对每组参数分别调用detectMultiScale（每次都重新构建图像金字塔）
+    返回: 与DETECTION_PARAMS一一对应的检测框列表
+    """
+    cascade = get_face_cascade()
+    
+    results = []
+    for i, param in enumerate(DETECTION_PARAMS):
+        with stage(f'cascade_pass_{i + 1}'):
+            detected = cascade.detectMultiScale(
+                gray,
+                scaleFactor=param['scaleFactor'],
+                minNeighbors=param['minNeighbors'],
+                minSize=param['minSize']
+            )
+        results.append(detected)
+    
+    return results
+
+def detect_single_pass(gray):
+    """
+    只构建一次图像金字塔，在其上评估所有参数组合
+    
+    以最小的scaleFactor扫描一次，minNeighbors=0取得未分组的原始窗口，
+    每个窗口的尺寸对应金字塔中的一层。每组参数只取离自己尺度序列最近的
+    那些层，再按自己的minNeighbors用groupRectangles分组，
+    与detectMultiScale内部的分组方式相同。
+    返回: 与DETECTION_PARAMS一一对应的检测框列表
+    """
+    cascade = get_face_cascade()
+    
+    base_scale = min(param['scaleFactor'] for param in DETECTION_PARAMS)
+    min_size = min(param['minSize'] for param in DETECTION_PARAMS)
+    
+    with stage('cascade_scan'):
+        raw = cascade.detectMultiScale(
+            gray,
+            scaleFactor=base_scale,
+            minNeighbors=0,
+            minSize=min_size
+        )
+    if len(raw) == 0:
+        return [[] for _ in DETECTION_PARAMS]
+    
+    with stage('cascade_group'):
+        raw = np.asarray(raw)
+        
+        # 由窗口尺寸反推其所在的金字塔层
+        window_w = cascade.getOriginalWindowSize()[0]
+        levels = np.rint(np.log(raw[:, 2] / window_w) / np.log(base_scale)).astype(int)
+        max_level = int(levels.max())
+        
+        results = []
+        for param in DETECTION_PARAMS:
+            # 该参数组的尺度序列 scaleFactor^k 对应到基础金字塔中最近的层
+            step = np.log(param['scaleFactor']) / np.log(base_scale)
+            wanted = set(np.rint(np.arange(0, max_level / step + 1) * step).astype(int))
+            keep = np.isin(levels, list(wanted))
+            keep &= (raw[:, 2] >= param['minSize'][0]) & (raw[:, 3] >= param['minSize'][1])
+            
+            candidates = raw[keep].tolist()
+            if len(candidates) == 0:
+                results.append([])
+                continue
+            
+            grouped, _ = cv2.groupRectangles(candidates, param['minNeighbors'], 0.2)
+            results.append(grouped)
+        
+        return results
+
 def merge_overlapping_boxes(boxes, iou_threshold=0.3):
-    """合并重叠的检测框"""
+    """
+    合并重叠的检测框（贪心NMS，IoU计算用NumPy向量化）
+    输入/输出: [(x, y, w, h, confidence), ...]，输出按置信度从高到低排列
+    """
     if len(boxes) == 0:
         return []
     
-    # 按置信度排序
-    boxes = sorted(boxes, key=lambda x: x[4], reverse=True)
+    arr = np.asarray([box[:5] for box in boxes], dtype=np.float64)
     
+    # 按置信度排序（stable与sorted(reverse=True)的并列顺序一致）
+    order = np.argsort(-arr[:, 4], kind='stable')
+    x1 = arr[order, 0]
+    y1 = arr[order, 1]
+    x2 = x1 + arr[order, 2]
+    y2 = y1 + arr[order, 3]
+    areas = arr[order, 2] * arr[order, 3]
+    
+    suppressed = np.zeros(len(order), dtype=bool)
     merged = []
-    used = [False] * len(boxes)
     
-    for i in range(len(boxes)):
-        if used[i]:
+    for i in range(len(order)):
+        if suppressed[i]:
             continue
         
-        x1, y1, w1, h1, conf1 = boxes[i]
-        merged.append(boxes[i])
-        used[i] = True
+        merged.append(boxes[order[i]])
         
-        # 检查是否与其他框重叠
-        for j in range(i + 1, len(boxes)):
-            if used[j]:
-                continue
-            
-            x2, y2, w2, h2, conf2 = boxes[j]
-            
-            # 计算IoU
-            x_left = max(x1, x2)
-            y_top = max(y1, y2)
-            x_right = min(x1 + w1, x2 + w2)
-            y_bottom = min(y1 + h1, y2 + h2)
-            
-            if x_right > x_left and y_bottom > y_top:
-                intersection = (x_right - x_left) * (y_bottom - y_top)
-                area1 = w1 * h1
-                area2 = w2 * h2
-                union = area1 + area2 - intersection
-                iou = intersection / union if union > 0 else 0
-                
-                if iou > iou_threshold:
-                    used[j] = True
+        # 计算当前框与其后所有框的IoU
+        rest = slice(i + 1, None)
+        inter_w = np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])
+        inter_h = np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])
+        overlap = (inter_w > 0) & (inter_h > 0)
+        intersection = np.where(overlap, inter_w * inter_h, 0.0)
+        union = areas[i] + areas[rest] - intersection
+        iou = np.divide(intersection, union, out=np.zeros_like(union), where=union > 0)
+        
+        suppressed[rest] |= iou > iou_threshold
     
     return merged
 
@@ -149,153 +499,863 @@ def expand_bbox(x, y, w, h, img_width, img_height, expand_ratio=0.3):
     
     return new_x, new_y, new_w, new_h
 
+def build_model(num_classes):
+    """构建ResNet18模型结构（不含权重）"""
+    from torchvision import models
+    
+    model = models.resnet18(pretrained=False)
+    num_features = model.fc.in_features
+    model.fc = nn.Linear(num_features, num_classes)
+    return model
+
+def torchscript_model_available():
+    """导出的TorchScript模型是否存在，且不比 best_model.pth 旧"""
+    if not os.path.exists(TORCHSCRIPT_MODEL_PATH):
+        return False
+    
+    if os.path.exists(MODEL_PATH) and os.path.getmtime(TORCHSCRIPT_MODEL_PATH) < os.path.getmtime(MODEL_PATH):
+        print("TorchScript模型比 best_model.pth 旧，已忽略（请重新运行 scripts/export_model.py）")
+        return False
+    
+    return True
+
+def load_torch_model(num_classes):
+    """
+    加载PyTorch模型（优先使用导出的TorchScript模型）
+    返回: (模型, 模型文件路径)
+    """
+    if torchscript_model_available():
+        model = torch.jit.load(TORCHSCRIPT_MODEL_PATH, map_location=device)
+        model.eval()
+        if device.type == 'cpu':
+            # 优化后的图无法保存，只能在加载后进行（CPU上会转换为MKLDNN算子）
+            model = torch.jit.optimize_for_inference(model)
+        print(f"使用TorchScript模型: {TORCHSCRIPT_MODEL_PATH}")
+        return model, TORCHSCRIPT_MODEL_PATH
+    
+    model = build_model(num_classes)
+    
+    # 加载权重
+    model.load_state_dict(torch.load(MODEL_PATH, map_location=device, weights_only=True))
+    model = model.to(device)
+    model.eval()
+    return model, MODEL_PATH
+
+class OnnxClassifier:
+    """
+    ONNX Runtime推理后端
+    与PyTorch模型的调用方式相同：输入NCHW张量，返回logits张量
+    """
+    
+    def __init__(self, path):
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def __call__(self, batch):
+        inputs = batch.detach().cpu().numpy().astype(np.float32, copy=False)
+        logits = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(logits)
+    
+    def eval(self):
+        return self
+
+def load_onnx_model():
+    """
+    加载ONNX Runtime推理后端
+    返回: (模型, 模型文件路径)
+    """
+    if not os.path.exists(ONNX_MODEL_PATH):
+        raise FileNotFoundError(
+            f"找不到ONNX模型: {ONNX_MODEL_PATH}（请先运行 scripts/export_model.py --onnx）"
+        )
+    
+    model = OnnxClassifier(ONNX_MODEL_PATH)
+    print(f"使用ONNX Runtime后端: {ONNX_MODEL_PATH}")
+    return model, ONNX_MODEL_PATH
+
+def load_quantized_model():
+    """
+    加载INT8量化模型（量化算子只能在CPU上运行）
+    返回: (模型, 模型文件路径)
+    """
+    global device
+    
+    if not os.path.exists(QUANTIZED_MODEL_PATH):
+        raise FileNotFoundError(
+            f"找不到INT8量化模型: {QUANTIZED_MODEL_PATH}（请先运行 scripts/quantize_model.py）"
+        )
+    
+    device = torch.device("cpu")
+    model = torch.jit.load(QUANTIZED_MODEL_PATH, map_location=device)
+    model.eval()
+    print(f"使用INT8量化模型: {QUANTIZED_MODEL_PATH}（量化引擎: {torch.backends.quantized.engine}）")
+    return model, QUANTIZED_MODEL_PATH
+
+def compute_model_version(path):
+    """由推理后端和模型文件内容生成模型版本号"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return f"{INFERENCE_BACKEND}-{digest.hexdigest()[:12]}"
+
+def cache_version(loaded=None):
+    """结果缓存使用的版本号：模型版本 + 影响识别结果的检测/预处理配置"""
+    loaded = loaded or current_model()
+    return f"{loaded.version}:{DETECTION_MODE}:{DETECTION_MAX_SIDE}:{int(FUSED_PREPROCESS)}:{int(DRAFT_DECODE)}"
+
+class LoadedModel:
+    """
+    一个已加载的模型版本：模型、类别名称和元数据
+    加载后不再修改，请求开始时取一次并一直使用，热更新时整体替换
+    """
+    
+    def __init__(self, model, device, class_names, version, display_names, model_info):
+        self.model = model
+        self.device = device
+        self.class_names = class_names
+        self.version = version
+        self.display_names = display_names
+        
+        # 模型信息预先序列化并计算ETag，接口直接返回
+        self.model_info_json = None
+        self.model_info_etag = None
+        if model_info is not None:
+            model_info = dict(model_info, model_version=version)
+            self.model_info_json = json.dumps(model_info, ensure_ascii=False).encode('utf-8')
+            self.model_info_etag = hashlib.sha256(self.model_info_json).hexdigest()[:16]
+
+def current_model():
+    """当前使用的模型版本"""
+    return model_registry.current()
+
+def load_metadata():
+    """
+    加载显示名称和模型信息
+    返回: (显示名称映射, 模型信息)，模型信息文件不存在时为None
+    """
+    display_names = {}
+    if os.path.exists(DISPLAY_NAMES_PATH):
+        with open(DISPLAY_NAMES_PATH, 'r', encoding='utf-8') as f:
+            display_names = json.load(f)
+    else:
+        print(f"未找到 {DISPLAY_NAMES_PATH}，使用类别名称作为显示名称")
+    
+    model_info = None
+    if os.path.exists(MODEL_INFO_PATH):
+        with open(MODEL_INFO_PATH, 'r', encoding='utf-8') as f:
+            model_info = json.load(f)
+    
+    return display_names, model_info
+
+def load_model_version():
+    """
+    从 models/ 目录加载一个模型版本并预热
+    启动时和热更新时调用，返回 LoadedModel
+    """
+    # 加载类别名称
+    with open(CLASS_NAMES_PATH, 'r', encoding='utf-8') as f:
+        class_names = json.load(f)
+    print(f"加载了 {len(class_names)} 个类别")
+    display_names, model_info = load_metadata()
+    
+    # 加载模型
+    if INFERENCE_BACKEND == 'onnx':
+        model, model_path = load_onnx_model()
+    elif INFERENCE_BACKEND == 'int8':
+        model, model_path = load_quantized_model()
+    elif INFERENCE_BACKEND == 'torch':
+        model, model_path = load_torch_model(len(class_names))
+    else:
+        raise ValueError(f"未知的推理后端: {INFERENCE_BACKEND}")
+    
+    loaded = LoadedModel(
+        model, device, class_names, compute_model_version(model_path), display_names, model_info
+    )
+    
+    if not preloading:
+        warmup_model(loaded)
+    
+    print(f"模型加载成功！版本: {loaded.version}")
+    return loaded
+
+def warmup_model(loaded):
+    """
+    按 WARMUP_BATCH_SIZES 用空白批次预热模型
+    第一次前向传播时才分配内存、创建线程池、选择算子实现，TorchScript还要在前两次调用时完成图优化，
+    提前跑完这些初始化，避免启动后（或切换版本后）的第一批请求变慢（预热不计入运行指标）
+    """
+    with unrecorded():
+        for batch_size in WARMUP_BATCH_SIZES:
+            warmup = torch.zeros((batch_size, 3, CROP_SIZE, CROP_SIZE))
+            for _ in range(2):
+                predict_tensor(warmup, top_k=1, loaded=loaded)
+
+def warmup_detection(loaded):
+    """预热人脸检测和区域预处理（OpenCV在第一次调用时分配缓冲区、创建线程池；不计入运行指标）"""
+    with unrecorded():
+        image = Image.new('RGB', (640, 480), (128, 128, 128))
+        _, _, batch = detect_regions(image)
+        predict_tensor(batch, top_k=5, loaded=loaded)
+
 def load_model():
     """加载训练好的模型"""
-    global model, class_names, device, transform
+    global model_registry, device, batcher, result_cache
+    global near_duplicate_index, pipeline
     
     # 设置设备
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"使用设备: {device}")
     
-    # 加载类别名称
-    with open('models/class_names.json', 'r', encoding='utf-8') as f:
-        class_names = json.load(f)
-    print(f"加载了 {len(class_names)} 个类别")
+    # 加载模型（模型文件变化后可以在后台重新加载并切换）
+    model_registry = ModelRegistry(
+        load_model_version,
+        watch_paths=[MODEL_PATH, TORCHSCRIPT_MODEL_PATH, ONNX_MODEL_PATH, QUANTIZED_MODEL_PATH,
+                     CLASS_NAMES_PATH, DISPLAY_NAMES_PATH, MODEL_INFO_PATH],
+        poll_interval=MODEL_WATCH_INTERVAL
+    )
+    model_registry.load_initial()
+    if MODEL_WATCH_INTERVAL > 0:
+        print(f"已开启模型热更新: 每 {MODEL_WATCH_INTERVAL}秒检查一次模型文件")
     
-    # 加载模型
-    model = models.resnet18(pretrained=False)
-    num_features = model.fc.in_features
-    model.fc = nn.Linear(num_features, len(class_names))
+    # 流水线的识别阶段由微批处理完成
+    if MICRO_BATCHING or PIPELINE:
+        batcher = InferenceBatcher(
+            predict_items, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS,
+            max_queue_size=PIPELINE_QUEUE_SIZE if PIPELINE else 0
+        )
+        print(f"已开启微批处理: 批次上限 {MAX_BATCH_SIZE}, 最长等待 {MAX_BATCH_WAIT_MS}ms")
     
-    # 加载权重
-    model.load_state_dict(torch.load('models/best_model.pth', map_location=device))
-    model = model.to(device)
-    model.eval()
-    print("模型加载成功！")
+    if PIPELINE:
+        pipeline = RecognitionPipeline(
+            # context 为 (模型版本, 请求的耗时记录)，各阶段的耗时记入对应的请求
+            lambda source, context: traced(context[1], decode_image, source),
+            lambda image, context: traced(context[1], detect_regions, image),
+            lambda tensors, context: batcher.submit([(context[0], tensor, context[1]) for tensor in tensors]),
+            lambda image, regions, results, context: traced(
+                context[1], build_detections, image.size, regions, results),
+            decode_threads=PIPELINE_DECODE_THREADS, detect_threads=DETECTION_THREADS,
+            queue_size=PIPELINE_QUEUE_SIZE
+        )
+        print(f"已开启识别流水线: 解码 {PIPELINE_DECODE_THREADS} 线程, 检测 {DETECTION_THREADS} 线程, "
+              f"队列容量 {PIPELINE_QUEUE_SIZE}")
+    
+    if RESULT_CACHE_SIZE > 0:
+        result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_PATH)
+        print(f"已开启结果缓存: {RESULT_CACHE_SIZE} 条, 有效期 {RESULT_CACHE_TTL}秒"
+              + (f", 磁盘: {RESULT_CACHE_PATH}" if RESULT_CACHE_PATH else ""))
     
-    # 定义图像预处理
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    if NEAR_DUPLICATE_INDEX_SIZE > 0:
+        near_duplicate_index = PerceptualIndex(NEAR_DUPLICATE_INDEX_SIZE, NEAR_DUPLICATE_THRESHOLD)
+        print(f"已开启近似重复索引: {NEAR_DUPLICATE_INDEX_SIZE} 条, 汉明距离阈值 {NEAR_DUPLICATE_THRESHOLD}")
     
     return True
 
-def get_character_display_name(class_name):
+def get_transform():
+    """torchvision的图像预处理（第一次使用时才导入torchvision并创建）"""
+    global transform
+    
+    if transform is None:
+        from torchvision import transforms
+        
+        transform = transforms.Compose([
+            transforms.Resize(RESIZE_SIZE),
+            transforms.CenterCrop(CROP_SIZE),
+            transforms.ToTensor(),
+            transforms.Normalize(NORMALIZE_MEAN, NORMALIZE_STD)
+        ])
+    return transform
+
+def get_character_display_name(class_name, loaded=None):
     """将类别名称转换为显示名称"""
-    name_mapping = {
-        '21hao': '21号',
-        'aerfa': '阿尔法',
-        'aila': '艾拉',
-        'bianka': '比安卡',
-        'dubian': '渡边',
-        'kaleinina': '卡列尼娜',
-        'kuluomu': '库洛姆',
-        'lee': '里',
-        'lifu': '丽芙',
-        'luna': '露娜',
-        'luosaita': '罗塞塔',
-        'luxiya': '露西亚',
-        'nuoan': '诺安',
-        'qishi': '七实',
-        'qu': '曲',
-        'sailinna': '赛琳娜',
-        'shenwei': '神威',
-        'wanshi': '万事',
-        'weila': '薇拉'
-    }
-    return name_mapping.get(class_name, class_name)
+    loaded = loaded or current_model()
+    return loaded.display_names.get(class_name, class_name)
 
 def predict_image(image):
     """预测图片中的角色"""
-    global model, class_names, device, transform
+    return predict_batch([image])[0]
+
+def predict_batch(images, top_k=None):
+    """
+    批量预测多张图片中的角色
+    所有图片堆叠成一个批次，只做一次前向传播和一次softmax/排序
+    top_k: 每张图片只返回前k个结果（None表示返回全部类别）
+    返回: 与images一一对应的结果列表
+    """
+    if len(images) == 0:
+        return []
+    
+    transform = get_transform()
     
     # 预处理图像
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    tensors = []
+    for image in images:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        tensors.append(transform(image))
     
-    img_tensor = transform(image).unsqueeze(0).to(device)
+    return predict_tensor(torch.stack(tensors), top_k=top_k)
+
+def predict_tensor(batch, top_k=None, loaded=None):
+    """
+    对已预处理好的批次张量 (N, 3, 224, 224) 进行预测
+    top_k: 每张图片只返回前k个结果（None表示返回全部类别）
+    loaded: 使用的模型版本（None表示当前版本）
+    返回: 与批次中每张图片一一对应的结果列表
+    """
+    if len(batch) == 0:
+        return []
+    
+    loaded = loaded or current_model()
+    model, class_names = loaded.model, loaded.class_names
+    num_classes = len(class_names)
+    k = num_classes if top_k is None else min(top_k, num_classes)
+    
+    all_probs = []
+    all_indices = []
+    
+    # 按批次大小分块，避免一次性占用过多内存
+    for start in range(0, len(batch), MAX_BATCH_SIZE):
+        chunk = batch[start:start + MAX_BATCH_SIZE].to(loaded.device)
+        batch_size_histogram.observe(len(chunk))
+        
+        # 预测
+        with stage('forward'), torch.no_grad():
+            outputs = model(chunk)
+            probabilities = torch.nn.functional.softmax(outputs, dim=1)
+            # 按概率排序（stable保证与逐张排序的结果顺序一致）
+            sorted_probs, sorted_indices = torch.sort(
+                probabilities, dim=1, descending=True, stable=True
+            )
+        
+        all_probs.append(sorted_probs[:, :k].cpu().numpy())
+        all_indices.append(sorted_indices[:, :k].cpu().numpy())
     
-    # 预测
-    with torch.no_grad():
-        outputs = model(img_tensor)
-        probabilities = torch.nn.functional.softmax(outputs, dim=1)
+    with stage('postprocess'):
+        all_probs = np.concatenate(all_probs)
+        all_indices = np.concatenate(all_indices)
         
-    # 获取所有类别的概率
-    probs = probabilities[0].cpu().numpy()
+        # 创建结果列表（按概率排序）
+        batch_results = []
+        for probs, indices in zip(all_probs, all_indices):
+            results = []
+            for idx, prob in zip(indices, probs):
+                results.append({
+                    'class_name': class_names[idx],
+                    'display_name': get_character_display_name(class_names[idx], loaded),
+                    'confidence': float(prob)
+                })
+            batch_results.append(results)
     
-    # 创建结果列表（按概率排序）
-    results = []
-    for idx, prob in enumerate(probs):
-        results.append({
-            'class_name': class_names[idx],
-            'display_name': get_character_display_name(class_names[idx]),
-            'confidence': float(prob)
-        })
+    return batch_results
+
+def resize_crop_box(x, y, w, h):
+    """
+    计算 Resize(256) + CenterCrop(224) 最终保留的区域在原图中的位置
+    返回: (left, top, right, bottom)，可直接从原图缩放到224x224
+    """
+    # 与 transforms.Resize(256) 相同：短边缩放到256，长边按比例取整
+    short, long = min(w, h), max(w, h)
+    new_short, new_long = RESIZE_SIZE, int(RESIZE_SIZE * long / short)
+    new_w, new_h = (new_short, new_long) if w <= h else (new_long, new_short)
+    
+    # 与 transforms.CenterCrop(224) 相同的裁剪偏移
+    crop_left = int(round((new_w - CROP_SIZE) / 2.0))
+    crop_top = int(round((new_h - CROP_SIZE) / 2.0))
     
-    # 按置信度排序
-    results.sort(key=lambda x: x['confidence'], reverse=True)
+    # 映射回原图坐标
+    scale_x = w / new_w
+    scale_y = h / new_h
+    left = x + int(round(crop_left * scale_x))
+    top = y + int(round(crop_top * scale_y))
+    right = max(left + 1, x + int(round((crop_left + CROP_SIZE) * scale_x)))
+    bottom = max(top + 1, y + int(round((crop_top + CROP_SIZE) * scale_y)))
+    return left, top, right, bottom
+
+def preprocess_regions(img_array, regions):
+    """
+    融合的预处理：从原图的uint8数组直接把每个区域缩放到224x224，
+    并在预分配的批次张量中原地完成归一化（不生成中间的PIL图片和张量）
+    img_array: RGB uint8数组 (H, W, 3)
+    regions: [(x, y, w, h), ...]
+    返回: 批次张量 (N, 3, 224, 224)
+    """
+    batch = torch.empty((len(regions), 3, CROP_SIZE, CROP_SIZE), dtype=torch.float32)
+    out = batch.numpy()
     
+    for i, (x, y, w, h) in enumerate(regions):
+        left, top, right, bottom = resize_crop_box(x, y, w, h)
+        src = img_array[top:bottom, left:right]
+        
+        # 缩小用INTER_AREA（抗锯齿，接近PIL的双线性缩小），放大用双线性
+        downscale = (right - left) > CROP_SIZE
+        interpolation = cv2.INTER_AREA if downscale else cv2.INTER_LINEAR
+        resized = cv2.resize(src, (CROP_SIZE, CROP_SIZE), interpolation=interpolation)
+        
+        # HWC -> CHW，并原地归一化: (x / 255 - mean) / std
+        np.subtract(resized.transpose(2, 0, 1), NORMALIZE_MEAN_255, out=out[i], casting='unsafe')
+        out[i] *= NORMALIZE_SCALE
+    
+    return batch
+
+def classify_regions(batch, top_k=None, loaded=None):
+    """
+    识别预处理好的区域批次
+    开启微批处理时与其他并发请求的区域合并成一个批次，否则直接预测
+    loaded: 使用的模型版本（None表示当前版本）
+    """
+    loaded = loaded or current_model()
+    if batcher is None:
+        return predict_tensor(batch, top_k=top_k, loaded=loaded)
+    
+    trace = current_trace()
+    results = batcher.predict([(loaded, tensor, trace) for tensor in batch])
+    return [r[:top_k] for r in results]
+
+def predict_items(items):
+    """
+    微批处理的执行函数：items 为 [(模型版本, 区域张量, 请求的耗时记录), ...]
+    切换模型版本期间同一批次中可能同时有新旧版本的请求，按版本分组预测
+    共享批次的前向传播耗时记入批次中每个请求的耗时明细
+    """
+    groups = {}
+    for idx, (loaded, _, _) in enumerate(items):
+        groups.setdefault(id(loaded), (loaded, []))[1].append(idx)
+    
+    results = [None] * len(items)
+    for loaded, indices in groups.values():
+        batch = torch.stack([items[idx][1] for idx in indices])
+        with tracing(RequestTrace()) as group_trace:
+            group_results = predict_tensor(batch, loaded=loaded)
+        for idx, result in zip(indices, group_results):
+            results[idx] = result
+        
+        traces = {id(items[idx][2]): items[idx][2] for idx in indices if items[idx][2] is not None}
+        for trace in traces.values():
+            trace.merge(group_trace)
     return results
 
-def predict_with_face_detection(image):
+class ImageTooLarge(ValueError):
+    """图片分辨率超过 MAX_IMAGE_PIXELS（识别接口返回413）"""
+
+class ReducedImage:
+    """
+    按缩小比例解码的JPEG（draft模式）
+    image: 缩小解码的RGB图片，用于人脸检测
+    size / width / height: 原图尺寸，检测框和返回结果中的坐标都相对原图
+    scale: 缩小解码的图片相对原图的比例
+    原分辨率只在需要时才解码（full），解码一次后复用，只截取需要的区域（不转换成整图数组）
+    """
+    
+    def __init__(self, image, size, source):
+        self.image = image
+        self.size = size
+        self.width, self.height = size
+        self.scale = min(image.width / size[0], image.height / size[1])
+        self._source = source
+        self._full = None
+        self._lock = threading.Lock()
+    
+    def full(self):
+        """原分辨率的RGB图片"""
+        with self._lock:
+            if self._full is None:
+                with stage('decode_full'):
+                    image = Image.open(io.BytesIO(self._source))
+                    if image.mode != 'RGB':
+                        image = image.convert('RGB')
+                    image.load()
+                    self._full = image
+            return self._full
+
+def open_image(source):
+    """
+    打开图片（只读取图片头，不解码像素），并按图片头中的尺寸检查分辨率
+    source: 图片字节或已打开的图片
+    """
+    try:
+        image = Image.open(io.BytesIO(source)) if isinstance(source, bytes) else source
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(
+            f"图片分辨率 {image.width}x{image.height} 超过限制（最多 {MAX_IMAGE_PIXELS} 像素）"
+        )
+    return image
+
+def draft_decode(image, source):
+    """
+    JPEG按不小于检测工作分辨率的最大比例（1/2、1/4、1/8）缩小解码
+    返回: ReducedImage，无法缩小时返回None（此时image仍未解码）
+    """
+    size = image.size
+    scale = detection_scale(*size)
+    if scale >= 1.0:
+        return None
+    
+    image.draft('RGB', (max(1, round(size[0] * scale)), max(1, round(size[1] * scale))))
+    if image.size == size:
+        return None
+    
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.load()
+    return ReducedImage(image, size, source)
+
+def decode_image(source):
+    """
+    解码图片
+    source: 图片字节、已打开的图片或 ReducedImage
+    先按图片头检查分辨率（超过限制时抛出 ImageTooLarge），较大的JPEG字节按缩小比例解码
+    返回: 完成解码的RGB图片，或 ReducedImage
+    """
+    if isinstance(source, ReducedImage):
+        return source
+    
+    with stage('decode'):
+        image = open_image(source)
+        if DRAFT_DECODE and isinstance(source, bytes) and image.format == 'JPEG':
+            reduced = draft_decode(image, source)
+            if reduced is not None:
+                return reduced
+        
+        if image.mode != 'RGB':
+            return image.convert('RGB')
+        image.load()
+        return image
+
+def scale_region(region, scale, img_width, img_height):
+    """把原图坐标的区域缩放到缩小解码的图片上"""
+    x, y, w, h = region
+    x = min(img_width - 1, int(x * scale))
+    y = min(img_height - 1, int(y * scale))
+    w = max(1, min(img_width - x, int(round(w * scale))))
+    h = max(1, min(img_height - y, int(round(h * scale))))
+    return x, y, w, h
+
+def split_reduced_regions(reduced, regions):
+    """
+    按区域最终缩放到224x224时需要的像素，决定从缩小的图片还是原分辨率截取
+    缩小图中对应区域的短边不小于224时直接使用（只会缩小，与从原图缩小的结果接近），否则需要原分辨率
+    返回: (缩小图中可用的区域序号和缩放后的坐标 [(序号, 区域), ...], 需要原分辨率的区域序号)
+    """
+    reduced_regions = []
+    full_indices = []
+    for idx, (x, y, w, h) in enumerate(regions):
+        left, top, right, bottom = resize_crop_box(x, y, w, h)
+        if min(right - left, bottom - top) * reduced.scale >= CROP_SIZE:
+            region = scale_region((x, y, w, h), reduced.scale, reduced.image.width, reduced.image.height)
+            reduced_regions.append((idx, region))
+        else:
+            full_indices.append(idx)
+    return reduced_regions, full_indices
+
+def detect_regions(image):
+    """
+    第一阶段：检测人脸并扩展边界框，同时完成该图片的区域预处理
+    image: 图片或 ReducedImage（在缩小的图片上检测，需要时才解码原分辨率截取区域）
+    返回: (RGB图片或 ReducedImage, 扩展后的区域 [(x, y, w, h, face_conf), ...], 预处理好的批次张量)
+    """
+    reduced = image if isinstance(image, ReducedImage) else None
+    
+    # 未解码的图片在这里完成解码（流水线模式下已在解码阶段完成）
+    with stage('decode'):
+        if reduced is not None:
+            detect_image = reduced.image
+        else:
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            detect_image = image
+        img_array = np.asarray(detect_image)
+    
+    # 检测人脸（缩小解码的图片上的检测框映射回原图坐标）
+    faces = detect_faces(detect_image, img_array=img_array)
+    if reduced is not None:
+        faces = [remap_box((x, y, w, h), reduced.scale, image.width, image.height) + (face_conf,)
+                 for x, y, w, h, face_conf in faces]
+    
+    with stage('crop'):
+        regions = []
+        for x, y, w, h, face_conf in faces:
+            # 扩展边界框以包含更多上下文
+            exp_x, exp_y, exp_w, exp_h = expand_bbox(
+                x, y, w, h, 
+                image.width, image.height, 
+                expand_ratio=0.5  # 扩展50%
+            )
+            regions.append((exp_x, exp_y, exp_w, exp_h, face_conf))
+        
+        boxes = [r[:4] for r in regions]
+        if reduced is not None:
+            reduced_regions, full_indices = split_reduced_regions(reduced, boxes)
+        
+        if not FUSED_PREPROCESS:
+            if reduced is None:
+                crops = [image.crop((x, y, x + w, y + h)) for x, y, w, h in boxes]
+            else:
+                crops = [None] * len(boxes)
+                for idx, (x, y, w, h) in reduced_regions:
+                    crops[idx] = reduced.image.crop((x, y, x + w, y + h))
+                for idx in full_indices:
+                    x, y, w, h = boxes[idx]
+                    crops[idx] = reduced.full().crop((x, y, x + w, y + h))
+    
+    # 预处理所有人脸区域（融合预处理中裁剪和缩放、归一化一起完成）
+    with stage('preprocess'):
+        if not FUSED_PREPROCESS:
+            batch = torch.stack([get_transform()(crop) for crop in crops])
+        elif reduced is None:
+            batch = preprocess_regions(img_array, boxes)
+        else:
+            batch = torch.empty((len(boxes), 3, CROP_SIZE, CROP_SIZE), dtype=torch.float32)
+            if reduced_regions:
+                batch[[idx for idx, _ in reduced_regions]] = preprocess_regions(
+                    img_array, [region for _, region in reduced_regions])
+            for idx in full_indices:
+                # 从原分辨率截取该区域后预处理（区域在截取结果中的坐标从0开始）
+                x, y, w, h = boxes[idx]
+                region_array = np.asarray(reduced.full().crop((x, y, x + w, y + h)))
+                batch[idx] = preprocess_regions(region_array, [(0, 0, w, h)])[0]
+    
+    return image, regions, batch
+
+def build_detections(image_size, regions, batch_results):
+    """
+    第二阶段的后处理：把识别结果和检测框组合成返回给前端的检测结果
+    image_size: 原图尺寸 (宽, 高)
+    """
+    with stage('postprocess'):
+        img_width, img_height = image_size
+        detections = []
+        
+        for idx, ((exp_x, exp_y, exp_w, exp_h, face_conf), results) in enumerate(zip(regions, batch_results)):
+            # 获取最佳结果
+            best_result = results[0]
+            
+            # 组合人脸检测置信度和识别置信度
+            combined_confidence = best_result['confidence'] * (0.7 + 0.3 * face_conf)
+            
+            detections.append({
+                'id': idx + 1,
+                'bbox': {
+                    'x': int(exp_x),
+                    'y': int(exp_y),
+                    'width': int(exp_w),
+                    'height': int(exp_h)
+                },
+                'bbox_percent': {
+                    'x': float((exp_x / img_width) * 100),
+                    'y': float((exp_y / img_height) * 100),
+                    'width': float((exp_w / img_width) * 100),
+                    'height': float((exp_h / img_height) * 100)
+                },
+                'character': best_result['display_name'],
+                'class_name': best_result['class_name'],
+                'confidence': float(combined_confidence),
+                'face_confidence': float(face_conf),
+                'recognition_confidence': float(best_result['confidence']),
+                'top5_results': results[:5]
+            })
+        
+        # 按置信度排序
+        detections.sort(key=lambda x: x['confidence'], reverse=True)
+        
+        return detections
+
+def predict_with_face_detection(image, loaded=None):
     """
     使用人脸检测 + 角色识别的两阶段方案
+    loaded: 使用的模型版本（None表示当前版本）
     """
     # 第一阶段：检测人脸
-    faces = detect_faces(image)
+    image, regions, batch = detect_regions(image)
     
-    # 第二阶段：对每个人脸区域进行识别
-    detections = []
+    # 第二阶段：识别角色（一次前向传播处理所有人脸）
+    batch_results = classify_regions(batch, top_k=5, loaded=loaded)
     
-    for idx, (x, y, w, h, face_conf) in enumerate(faces):
-        # 扩展边界框以包含更多上下文
-        exp_x, exp_y, exp_w, exp_h = expand_bbox(
-            x, y, w, h, 
-            image.width, image.height, 
-            expand_ratio=0.5  # 扩展50%
-        )
+    return build_detections(image.size, regions, batch_results)
+
+def get_detection_pool():
+    """获取当前进程的检测线程池（fork之后子进程中需要重新创建）"""
+    global detection_pool, detection_pool_pid
+    
+    with detection_pool_lock:
+        if detection_pool is None or detection_pool_pid != os.getpid():
+            detection_pool = ThreadPoolExecutor(
+                max_workers=DETECTION_THREADS, thread_name_prefix='detection'
+            )
+            detection_pool_pid = os.getpid()
+    return detection_pool
+
+def predict_many(images, loaded=None):
+    """
+    批量识别多张图片
+    人脸检测在线程池中并行（OpenCV检测时会释放GIL），
+    所有图片的人脸区域合并成共享的批次统一识别
+    loaded: 使用的模型版本（None表示当前版本）
+    返回: 与images一一对应的检测结果列表（与 predict_with_face_detection 的返回格式相同）
+    """
+    if len(images) == 0:
+        return []
+    
+    loaded = loaded or current_model()
+    
+    # 流水线模式下逐张提交，由流水线完成检测和合批识别
+    if pipeline is not None:
+        futures = [pipeline.submit(image, PIPELINE_SUBMIT_TIMEOUT, context=(loaded, current_trace())) for image in images]
+        return [future.result() for future in futures]
+    
+    # 第一阶段：并行检测（各阶段耗时记入发起请求的耗时记录）
+    trace = current_trace()
+    stages = list(get_detection_pool().map(lambda image: traced(trace, detect_regions, image), images))
+    
+    # 第二阶段：所有人脸区域一起识别
+    batch = torch.cat([batch for _, _, batch in stages])
+    batch_results = classify_regions(batch, top_k=5, loaded=loaded)
+    
+    all_detections = []
+    offset = 0
+    for image, regions, _ in stages:
+        results = batch_results[offset:offset + len(regions)]
+        offset += len(regions)
+        all_detections.append(build_detections(image.size, regions, results))
+    
+    return all_detections
+
+def create_app(preload=False):
+    """
+    应用工厂：加载人脸检测器和模型，返回Flask应用
+    已加载过的组件不会重复加载。生产环境（serve_v2.py）在gunicorn主进程中
+    fork之前以 preload=True 调用一次，各worker以写时复制方式共享同一份模型权重；
+    此时不预热，fork之后由各worker在 init_worker 中预热
+    """
+    global preloading
+    
+    if face_cascade is not None and model_registry is not None:
+        return app
+    
+    preloading = preload
+    if preloading:
+        # fork之前主进程只用一个线程（加载模型时的图优化也会用到torch的线程池），也不绑定CPU核：
+        # 主进程只负责管理worker，各worker的线程数和CPU绑定在 init_worker 中设置
+        torch.set_num_threads(1)
+        cv2.setNumThreads(1)
+    else:
+        threads = configure_worker()
+        print(f"torch线程数: {threads['torch_threads']}, OpenCV线程数: {threads['opencv_threads']}"
+              + (f", 绑定CPU核: {threads['cpus']}" if threads['cpus'] is not None else ""))
+    
+    started = time.perf_counter()
+    if face_cascade is None and not load_face_detector():
+        raise RuntimeError("人脸检测器加载失败")
+    startup_timings['face_detector'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    if model_registry is None and not load_model():
+        raise RuntimeError("模型加载失败")
+    startup_timings['model'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    if WARMUP_BATCH_SIZES and not preloading:
+        warmup_detection(current_model())
+    startup_timings['warmup'] = time.perf_counter() - started
+    
+    print("启动耗时: " + ", ".join(f"{name} {seconds:.2f}秒" for name, seconds in startup_timings.items()))
+    return app
+
+def init_worker(slot=0, workers=1):
+    """
+    gunicorn fork出worker之后在worker中调用：设置线程数和CPU绑定，预热模型和人脸检测，
+    并开始检查模型文件（开启热更新时，只在worker中轮询）、定期写入指标文件
+    预热不能在主进程中进行：主进程用多个线程执行过前向传播后再fork，worker中的OpenMP线程池会卡死
+    返回: 实际使用的线程配置（见 configure_worker）
+    """
+    global preloading
+    
+    preloading = False
+    threads = configure_worker(slot, workers)
+    loaded = current_model()
+    if WARMUP_BATCH_SIZES:
+        warmup_model(loaded)
+        warmup_detection(loaded)
+    metrics.start_flushing()
+    return threads
+
+def recognize_image_bytes(image_bytes):
+    """
+    识别一张上传的图片（依次查询结果缓存、近似重复索引，都未命中时执行检测和识别）
+    返回: 识别接口的响应内容
+    """
+    # 整个请求使用同一个模型版本（热更新期间正在处理的请求在旧版本上完成）
+    loaded = current_model()
+    version = cache_version(loaded)
+    
+    # 相同图片直接返回缓存的结果
+    cache_key = None
+    detections = None
+    if result_cache is not None:
+        with stage('cache_lookup'):
+            cache_key = content_key(image_bytes, version)
+            detections = result_cache.get(cache_key)
+    cached = detections is not None
+    near_duplicate = False
+    
+    if not cached:
+        # 流水线模式下由解码线程解码（分辨率超过限制时同样抛出 ImageTooLarge）
+        image = image_bytes
+        
+        # 近似重复的图片复用缓存的检测结果（检测框按新尺寸缩放）
+        image_hash = None
+        if near_duplicate_index is not None:
+            image = decode_image(image_bytes)
+            with stage('cache_lookup'):
+                image_hash = dhash(image.image if isinstance(image, ReducedImage) else image)
+                detections = near_duplicate_index.find(image_hash, image.size, version)
+            near_duplicate = detections is not None
         
-        # 裁剪人脸区域
-        face_region = image.crop((exp_x, exp_y, exp_x + exp_w, exp_y + exp_h))
-        
-        # 识别角色
-        results = predict_image(face_region)
-        
-        # 获取最佳结果
-        best_result = results[0]
-        
-        # 组合人脸检测置信度和识别置信度
-        combined_confidence = best_result['confidence'] * (0.7 + 0.3 * face_conf)
-        
-        detections.append({
-            'id': idx + 1,
-            'bbox': {
-                'x': int(exp_x),
-                'y': int(exp_y),
-                'width': int(exp_w),
-                'height': int(exp_h)
-            },
-            'bbox_percent': {
-                'x': float((exp_x / image.width) * 100),
-                'y': float((exp_y / image.height) * 100),
-                'width': float((exp_w / image.width) * 100),
-                'height': float((exp_h / image.height) * 100)
-            },
-            'character': best_result['display_name'],
-            'class_name': best_result['class_name'],
-            'confidence': float(combined_confidence),
-            'face_confidence': float(face_conf),
-            'recognition_confidence': float(best_result['confidence']),
-            'top5_results': results[:5]
-        })
-    
-    # 按置信度排序
-    detections.sort(key=lambda x: x['confidence'], reverse=True)
-    
-    return detections
+        if not near_duplicate:
+            # 使用人脸检测 + 识别（流水线模式下由后台线程完成）
+            if pipeline is not None:
+                detections = pipeline.predict(
+                    image, PIPELINE_SUBMIT_TIMEOUT, context=(loaded, current_trace())
+                )
+            else:
+                detections = predict_with_face_detection(decode_image(image), loaded)
+            
+            if image_hash is not None:
+                near_duplicate_index.add(image_hash, image.size, version, detections)
+        
+        if cache_key is not None:
+            result_cache.put(cache_key, detections)
+    
+    return {
+        'success': True,
+        'detections': detections,
+        'num_faces': len(detections),
+        'total_classes': len(loaded.class_names),
+        'model_version': loaded.version,
+        'cached': cached or near_duplicate,
+        'near_duplicate': near_duplicate
+    }
+
+@app.before_request
+def start_request():
+    """记录请求开始时间；带有调试请求头时记录该请求各阶段的耗时"""
+    g.request_started = time.perf_counter()
+    g.trace = RequestTrace() if request.headers.get(DEBUG_TIMING_HEADER) == '1' else None
+
+@app.after_request
+def finish_request(response):
+    """记录请求耗时和状态码"""
+    started = g.get('request_started')
+    if started is not None:
+        record_request(request.endpoint or 'unmatched', response.status_code, time.perf_counter() - started)
+    return response
 
 @app.route('/')
 def index():
@@ -305,6 +1365,10 @@ def index():
 @app.route('/api/recognize', methods=['POST'])
 def recognize():
     """识别接口 - 使用人脸检测"""
+    # 全局的请求大小限制按批量接口设置，单图接口在解析请求体之前按声明的大小拒绝
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+        return jsonify({'error': '图片超过10MB限制'}), 413
+    
     try:
         # 检查是否有文件
         if 'image' not in request.files:
@@ -315,22 +1379,123 @@ def recognize():
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
         
-        # 读取图片
-        image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        # 读取图片（最多多读1个字节用于判断是否超限）
+        image_bytes = file.read(MAX_UPLOAD_SIZE + 1)
+        if len(image_bytes) > MAX_UPLOAD_SIZE:
+            return jsonify({'error': '图片超过10MB限制'}), 413
         
-        # 使用人脸检测 + 识别
-        detections = predict_with_face_detection(image)
+        result = traced(g.trace, recognize_image_bytes, image_bytes)
+        if g.trace is not None:
+            result['timing'] = g.trace.to_dict()
+        return jsonify(result)
         
-        return jsonify({
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except queue.Full:
+        return jsonify({'error': '服务繁忙，请稍后重试'}), 503
+    except Exception as e:
+        print(f"识别错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'识别失败: {str(e)}'}), 500
+
+def read_batch_uploads():
+    """
+    读取批量识别接口上传的图片
+    支持多个 images 文件字段，或 archive 字段上传的zip压缩包
+    返回: [(文件名, 图片字节), ...]
+    """
+    uploads = []
+    
+    for file in request.files.getlist('images'):
+        if file.filename:
+            uploads.append((file.filename, file.read()))
+    
+    archive = request.files.get('archive')
+    if archive is not None and archive.filename:
+        with zipfile.ZipFile(io.BytesIO(archive.read())) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                    continue
+                # 按声明的解压大小过滤，防止压缩炸弹
+                if info.file_size > MAX_UPLOAD_SIZE:
+                    uploads.append((info.filename, None))
+                    continue
+                uploads.append((info.filename, zf.read(info)))
+                if len(uploads) > BATCH_MAX_IMAGES:
+                    break
+    
+    return uploads
+
+@app.route('/api/recognize_batch', methods=['POST'])
+def recognize_batch():
+    """批量识别接口 - 多张图片并行检测，人脸区域合并批次识别"""
+    try:
+        uploads = read_batch_uploads()
+        
+        if len(uploads) == 0:
+            return jsonify({'error': '没有上传图片'}), 400
+        if len(uploads) > BATCH_MAX_IMAGES:
+            return jsonify({'error': f'单次最多上传 {BATCH_MAX_IMAGES} 张图片'}), 400
+        
+        # 整个请求使用同一个模型版本
+        loaded = current_model()
+        version = cache_version(loaded)
+        results = [None] * len(uploads)
+        pending = []
+        
+        for idx, (filename, image_bytes) in enumerate(uploads):
+            if image_bytes is None or len(image_bytes) > MAX_UPLOAD_SIZE:
+                results[idx] = {'filename': filename, 'error': '图片超过10MB限制'}
+                continue
+            
+            # 相同图片直接使用缓存的结果
+            cache_key = None
+            if result_cache is not None:
+                cache_key = content_key(image_bytes, version)
+                detections = result_cache.get(cache_key)
+                if detections is not None:
+                    results[idx] = {'filename': filename, 'detections': detections,
+                                    'num_faces': len(detections), 'cached': True}
+                    continue
+            
+            try:
+                image = traced(g.trace, decode_image, image_bytes)
+            except ImageTooLarge as e:
+                results[idx] = {'filename': filename, 'error': str(e)}
+                continue
+            except Exception as e:
+                results[idx] = {'filename': filename, 'error': f'无法读取图片: {str(e)}'}
+                continue
+            
+            pending.append((idx, filename, cache_key, image))
+        
+        # 未命中缓存的图片一起识别
+        all_detections = traced(g.trace, predict_many, [image for _, _, _, image in pending], loaded)
+        
+        for (idx, filename, cache_key, _), detections in zip(pending, all_detections):
+            if cache_key is not None:
+                result_cache.put(cache_key, detections)
+            results[idx] = {'filename': filename, 'detections': detections,
+                            'num_faces': len(detections), 'cached': False}
+        
+        response = {
             'success': True,
-            'detections': detections,
-            'num_faces': len(detections),
-            'total_classes': len(class_names)
-        })
+            'results': results,
+            'num_images': len(results),
+            'total_classes': len(loaded.class_names),
+            'model_version': loaded.version
+        }
+        if g.trace is not None:
+            response['timing'] = g.trace.to_dict()
+        return jsonify(response)
         
+    except zipfile.BadZipFile:
+        return jsonify({'error': '无法读取zip压缩包'}), 400
+    except queue.Full:
+        return jsonify({'error': '服务繁忙，请稍后重试'}), 503
     except Exception as e:
-        print(f"识别错误: {str(e)}")
+        print(f"批量识别错误: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'识别失败: {str(e)}'}), 500
@@ -338,12 +1503,95 @@ def recognize():
 @app.route('/api/model_info')
 def model_info():
     """获取模型信息"""
-    try:
-        with open('models/model_info.json', 'r', encoding='utf-8') as f:
-            info = json.load(f)
-        return jsonify(info)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    loaded = current_model()
+    if loaded.model_info_json is None:
+        return jsonify({'error': f'未找到 {MODEL_INFO_PATH}'}), 500
+    
+    # 客户端带有相同ETag时返回304
+    response = Response(loaded.model_info_json, mimetype='application/json')
+    response.set_etag(loaded.model_info_etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def check_admin_token():
+    """管理接口的访问检查，未通过时返回错误响应"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': '管理接口未开启（请设置 PGR_ADMIN_TOKEN）'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': '无权访问'}), 403
+    return None
+
+@app.route('/api/admin/reload_model', methods=['POST'])
+def reload_model():
+    """
+    在后台重新加载 models/ 目录中的模型，预热后切换（不中断正在处理的请求）
+    ?wait=1 时等待加载完成后返回
+    多worker部署时只有处理该请求的worker会重新加载，请改用 PGR_MODEL_WATCH_INTERVAL
+    """
+    error = check_admin_token()
+    if error is not None:
+        return error
+    
+    started = model_registry.reload(wait=request.args.get('wait') == '1')
+    status = model_registry.status()
+    status['started'] = started
+    return jsonify(status), 202 if status['reloading'] else 200
+
+@app.route('/api/admin/model_status')
+def model_status():
+    """当前模型版本和热更新状态"""
+    error = check_admin_token()
+    if error is not None:
+        return error
+    return jsonify(model_registry.status())
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    """获取结果缓存的命中统计"""
+    stats = {'enabled': result_cache is not None}
+    if result_cache is not None:
+        stats.update(result_cache.stats())
+    
+    stats['near_duplicate'] = {'enabled': near_duplicate_index is not None}
+    if near_duplicate_index is not None:
+        stats['near_duplicate'].update(near_duplicate_index.stats())
+    
+    return jsonify(stats)
+
+def collect_runtime_metrics():
+    """由其他组件维护的数值（抓取时读取）：缓存命中数、流水线队列长度、当前模型版本"""
+    collected = []
+    if result_cache is not None:
+        stats = result_cache.stats()
+        collected.append(('pgr_result_cache_lookups_total', 'counter', '结果缓存的查询次数', [
+            ({'result': 'hit'}, stats['hits']),
+            ({'result': 'disk_hit'}, stats['disk_hits']),
+            ({'result': 'miss'}, stats['misses'])
+        ]))
+    if near_duplicate_index is not None:
+        stats = near_duplicate_index.stats()
+        collected.append(('pgr_near_duplicate_lookups_total', 'counter', '近似重复索引的查询次数', [
+            ({'result': 'hit'}, stats['hits']),
+            ({'result': 'miss'}, stats['misses'])
+        ]))
+    if pipeline is not None:
+        stats = pipeline.stats()
+        collected.append(('pgr_pipeline_queue_depth', 'gauge', '流水线各阶段队列中等待的任务数', [
+            ({'queue': 'decode'}, stats['decode_queue']),
+            ({'queue': 'detect'}, stats['detect_queue'])
+        ]))
+    if model_registry is not None and model_registry.current() is not None:
+        collected.append(('pgr_model_info', 'gauge', '当前使用的模型版本（多进程部署时为使用该版本的进程数）', [
+            ({'version': model_registry.current().version, 'backend': INFERENCE_BACKEND}, 1)
+        ]))
+    return collected
+
+metrics.register_collector(collect_runtime_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus格式的运行指标（各阶段耗时、每张图片的人脸数、未检测到人脸的比例等）"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     print("=" * 60)
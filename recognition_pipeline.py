@@ -0,0 +1,122 @@
+"""
+识别流水线
+把一次识别拆成三个阶段，分别在各自的线程中运行，阶段之间用有界队列连接：
+
+    解码（I/O和图片解码） -> 人脸检测（线程池，OpenCV检测时会释放GIL） -> 识别（跨请求合批）
+
+请求线程只负责提交和等待结果，不同请求的不同阶段可以同时进行。
+队列满时提交会阻塞（超时后抛出 queue.Full），上游阶段随之减速，形成背压。
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class RecognitionPipeline:
+    """
+    decode: (输入, context) -> 图片（解码阶段）
+    detect: (图片, context) -> (图片, 区域列表, 批次张量)（检测阶段）
+    classify: (区域张量列表, context) -> Future，结果为与之一一对应的识别结果（识别阶段，通常交给 InferenceBatcher）
+    finish: (图片, 区域列表, 识别结果, context) -> 最终结果
+
+    context 由 submit 传入，原样传给各阶段（例如请求使用的模型版本、请求的耗时记录）
+    """
+
+    def __init__(self, decode, detect, classify, finish,
+                 decode_threads=2, detect_threads=4, queue_size=64):
+        self.decode = decode
+        self.detect = detect
+        self.classify = classify
+        self.finish = finish
+        self.decode_threads = decode_threads
+        self.detect_threads = detect_threads
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._decode_queue = None
+        self._detect_queue = None
+        self._threads = []
+        self._pid = None
+
+    def submit(self, source, timeout=None, context=None):
+        """
+        提交一张图片，返回 Future，结果为 finish 的返回值
+        解码队列已满且超过 timeout 秒仍无法放入时抛出 queue.Full
+        """
+        self._ensure_started()
+        future = Future()
+        self._decode_queue.put((source, context, future), timeout=timeout)
+        return future
+
+    def predict(self, source, timeout=None, context=None):
+        """提交并等待结果"""
+        return self.submit(source, timeout, context).result()
+
+    def stats(self):
+        """各阶段队列中等待的任务数"""
+        if self._pid != os.getpid():
+            return {'decode_queue': 0, 'detect_queue': 0, 'queue_size': self.queue_size}
+        return {
+            'decode_queue': self._decode_queue.qsize(),
+            'detect_queue': self._detect_queue.qsize(),
+            'queue_size': self.queue_size
+        }
+
+    def _ensure_started(self):
+        """按需启动各阶段的线程（fork之后子进程中没有这些线程，需要重新启动）"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._decode_queue = queue.Queue(self.queue_size)
+            self._detect_queue = queue.Queue(self.queue_size)
+            self._threads = []
+            for i in range(self.decode_threads):
+                self._start_thread(self._decode_loop, f'pipeline-decode-{i}')
+            for i in range(self.detect_threads):
+                self._start_thread(self._detect_loop, f'pipeline-detect-{i}')
+            self._pid = pid
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(
+            target=target, args=(self._decode_queue, self._detect_queue),
+            name=name, daemon=True
+        )
+        thread.start()
+        self._threads.append(thread)
+
+    def _decode_loop(self, decode_queue, detect_queue):
+        """解码阶段：解码后放入检测队列（检测队列满时阻塞）"""
+        while True:
+            source, context, future = decode_queue.get()
+            try:
+                image = self.decode(source, context)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            detect_queue.put((image, context, future))
+
+    def _detect_loop(self, decode_queue, detect_queue):
+        """检测阶段：检测并预处理区域后交给识别阶段，识别完成时由回调组装最终结果"""
+        while True:
+            image, context, future = detect_queue.get()
+            try:
+                image, regions, batch = self.detect(image, context)
+                classified = self.classify(list(batch), context)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            classified.add_done_callback(
+                lambda done, image=image, regions=regions, context=context, future=future:
+                    self._complete(done, image, regions, context, future)
+            )
+
+    def _complete(self, classified, image, regions, context, future):
+        try:
+            future.set_result(self.finish(image, regions, classified.result(), context))
+        except Exception as e:
+            future.set_exception(e)
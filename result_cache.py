@@ -0,0 +1,317 @@
+"""
+识别结果缓存
+以图片内容哈希 + 模型版本作为键，内存中按LRU/TTL淘汰，
+可选的SQLite磁盘层在服务重启后仍然有效，并可在多个worker进程间共享
+
+另有基于感知哈希（dHash）的近似重复索引，重新编码、缩放或轻微裁剪过的
+同一张图片也能命中，检测框按新图片尺寸缩放后返回
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+# 磁盘层每写入多少次检查一次条目上限
+DISK_TRIM_INTERVAL = 100
+
+
+def content_key(image_bytes, version):
+    """由图片字节内容和模型版本生成缓存键"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{version}:{digest}"
+
+
+class ResultCache:
+    """
+    两级结果缓存
+
+    max_entries: 内存层最多保存的条目数（超出时淘汰最久未使用的）
+    ttl: 条目有效期（秒），0表示不过期
+    disk_path: SQLite文件路径，None表示不启用磁盘层
+    max_disk_entries: 磁盘层最多保存的条目数（超出时删除最早写入的）
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, disk_path=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_writes = 0
+
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            with self._connect() as conn:
+                # WAL模式下多个worker进程可以同时读写
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+
+    @contextmanager
+    def _connect(self):
+        """每次操作单独打开连接（SQLite连接不能跨线程或跨fork共享），结束时提交并关闭"""
+        conn = sqlite3.connect(self.disk_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _expired(self, created):
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key):
+        """查询缓存，未命中时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._disk_get(key) if self.disk_path else None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+
+        # 磁盘命中的条目提升到内存层
+        self._memory_put(key, value, time.time())
+        return value
+
+    def put(self, key, value):
+        """写入缓存（value需要可以JSON序列化）"""
+        created = time.time()
+        self._memory_put(key, value, created)
+        if self.disk_path:
+            self._disk_put(key, value, created)
+
+    def _memory_put(self, key, value, created):
+        with self._lock:
+            self._entries[key] = (created, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created = row
+                if self._expired(created):
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    return None
+                return json.loads(value)
+        except sqlite3.Error as e:
+            print(f"读取结果缓存失败: {e}")
+            return None
+
+    def _disk_put(self, key, value, created):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), created)
+                )
+                self._disk_writes += 1
+                if self._disk_writes % DISK_TRIM_INTERVAL != 0:
+                    return
+                # 定期删除超出上限的最早写入的条目
+                conn.execute(
+                    "DELETE FROM results WHERE key IN ("
+                    "SELECT key FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+        except sqlite3.Error as e:
+            print(f"写入结果缓存失败: {e}")
+
+    def stats(self):
+        """命中/未命中计数"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk_enabled': bool(self.disk_path),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+
+def dhash(image, hash_size=8):
+    """
+    计算图片的差值哈希（dHash），返回64位整数
+    重新编码、缩放、轻微裁剪后的同一张图片哈希值的汉明距离很小
+    """
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    # 先缩小再转灰度（不用reducing_gap：先整数倍缩小会让不同尺寸的同一张图片哈希差异变大）
+    small = image.resize((hash_size + 1, hash_size), Image.BILINEAR).convert('L')
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def rescale_detections(detections, src_size, dst_size):
+    """将缓存的检测结果的像素坐标按图片尺寸缩放（百分比坐标不变）"""
+    scale_x = dst_size[0] / src_size[0]
+    scale_y = dst_size[1] / src_size[1]
+
+    rescaled = []
+    for detection in detections:
+        detection = dict(detection)
+        bbox = detection['bbox']
+        detection['bbox'] = {
+            'x': int(round(bbox['x'] * scale_x)),
+            'y': int(round(bbox['y'] * scale_y)),
+            'width': int(round(bbox['width'] * scale_x)),
+            'height': int(round(bbox['height'] * scale_y))
+        }
+        rescaled.append(detection)
+    return rescaled
+
+
+class PerceptualIndex:
+    """
+    近似重复图片索引（多索引哈希）
+
+    把64位哈希切成 threshold + 1 段，汉明距离不超过 threshold 的两个哈希
+    至少有一段完全相同（抽屉原理）。每段建一个倒排表，查询时只需比较
+    与任一段相同的候选，几十万条目时仍然很快。
+
+    max_entries: 最多保存的条目数（超出时淘汰最久未使用的）
+    threshold: 认为是同一张图片的最大汉明距离
+    max_aspect_diff: 宽高比的最大相对差异（差异更大时不认为是同一张图片）
+    """
+
+    HASH_BITS = 64
+
+    def __init__(self, max_entries=100000, threshold=4, max_aspect_diff=0.02):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_aspect_diff = max_aspect_diff
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+        # 每段的 (起始位, 位数)
+        num_blocks = threshold + 1
+        base, extra = divmod(self.HASH_BITS, num_blocks)
+        self._blocks = []
+        start = 0
+        for i in range(num_blocks):
+            width = base + (1 if i < extra else 0)
+            self._blocks.append((start, width))
+            start += width
+        self._tables = [{} for _ in self._blocks]
+
+    def _block_values(self, value):
+        return [(value >> start) & ((1 << width) - 1) for start, width in self._blocks]
+
+    def find(self, image_hash, size, version):
+        """
+        查找近似重复的图片
+        返回: 按 size 缩放后的检测结果，未找到时返回None
+        """
+        aspect = size[0] / size[1]
+
+        with self._lock:
+            best_id = None
+            best_distance = self.threshold + 1
+            seen = set()
+
+            for table, block in zip(self._tables, self._block_values(image_hash)):
+                for entry_id in table.get(block, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+
+                    entry_hash, entry_size, entry_version, _ = self._entries[entry_id]
+                    if entry_version != version:
+                        continue
+                    entry_aspect = entry_size[0] / entry_size[1]
+                    if abs(entry_aspect - aspect) / entry_aspect > self.max_aspect_diff:
+                        continue
+                    distance = hamming_distance(entry_hash, image_hash)
+                    if distance < best_distance:
+                        best_id, best_distance = entry_id, distance
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            _, entry_size, _, detections = self._entries[best_id]
+
+        return rescale_detections(detections, entry_size, size)
+
+    def add(self, image_hash, size, version, detections):
+        """加入一张图片的检测结果"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (image_hash, tuple(size), version, detections)
+            for table, block in zip(self._tables, self._block_values(image_hash)):
+                table.setdefault(block, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        image_hash = self._entries.pop(entry_id)[0]
+        for table, block in zip(self._tables, self._block_values(image_hash)):
+            bucket = table[block]
+            bucket.discard(entry_id)
+            if not bucket:
+                del table[block]
+
+    def stats(self):
+        """命中/未命中计数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,164 @@
+"""
+人脸检测性能测试
+对比 multi_pass（每组参数各扫描一次）与 single_pass（共享一次扫描）两种检测模式
+输出每百万像素耗时，以及 single_pass 相对 multi_pass 的召回率
+
+--time-nms: 对比向量化的 merge_overlapping_boxes 与原逐对计算IoU的实现的耗时
+（两者结果一致由 tests/test_merge_overlapping_boxes.py 校验）
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import cv2
+from PIL import Image
+
+# 从项目根目录导入V2应用
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recognition_app_v2 as app
+from tests.test_merge_overlapping_boxes import merge_overlapping_boxes_reference, random_boxes
+
+MODES = ['multi_pass', 'single_pass']
+
+# 合成测试图片的分辨率（宽, 高）
+DEFAULT_SIZES = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+
+def make_synthetic_image(width, height, seed=0):
+    """生成带有平滑纹理的合成图片（比纯噪声更接近真实画面的检测开销）"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-20, 21, img.shape, dtype=np.int16)
+    img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(img)
+
+def load_images(image_dir):
+    """加载目录中的所有图片"""
+    images = []
+    for name in sorted(os.listdir(image_dir)):
+        if not name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+            continue
+        images.append((name, Image.open(os.path.join(image_dir, name)).convert('RGB')))
+    return images
+
+def box_iou(a, b):
+    """计算两个 (x, y, w, h) 框的IoU"""
+    x_left = max(a[0], b[0])
+    y_top = max(a[1], b[1])
+    x_right = min(a[0] + a[2], b[0] + b[2])
+    y_bottom = min(a[1] + a[3], b[1] + b[3])
+    if x_right <= x_left or y_bottom <= y_top:
+        return 0.0
+    intersection = (x_right - x_left) * (y_bottom - y_top)
+    return intersection / (a[2] * a[3] + b[2] * b[3] - intersection)
+
+def recall(reference, candidate, iou_threshold=0.5):
+    """reference 中有多少框能在 candidate 中找到 IoU 超过阈值的对应框"""
+    if len(reference) == 0:
+        return 1.0
+    matched = 0
+    for ref in reference:
+        if any(box_iou(ref, box) >= iou_threshold for box in candidate):
+            matched += 1
+    return matched / len(reference)
+
+def face_boxes(faces, image):
+    """去掉未检测到人脸时返回的整图回退框"""
+    whole = (0, 0, image.width, image.height)
+    return [tuple(f[:4]) for f in faces if tuple(f[:4]) != whole]
+
+def time_nms():
+    """对比向量化NMS与原实现的耗时"""
+    print("=" * 60)
+    print("NMS 耗时对比")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    for n in [50, 200, 800]:
+        boxes = random_boxes(rng, n)
+        timings = {}
+        for name, fn in [('reference', merge_overlapping_boxes_reference),
+                         ('vectorized', app.merge_overlapping_boxes)]:
+            start = time.perf_counter()
+            for _ in range(5):
+                fn(boxes)
+            timings[name] = (time.perf_counter() - start) / 5
+        print(f"  n={n:4d}  reference {timings['reference'] * 1000:8.2f} ms  "
+              f"vectorized {timings['vectorized'] * 1000:8.2f} ms")
+
+def time_detection(image, mode, repeat):
+    """多次运行检测，返回最短耗时（秒）和检测结果"""
+    best = float('inf')
+    faces = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        faces = app.detect_faces(image, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return best, faces
+
+def main():
+    parser = argparse.ArgumentParser(description='人脸检测性能测试')
+    parser.add_argument('--images', help='测试图片目录（默认使用合成图片）')
+    parser.add_argument('--repeat', type=int, default=3, help='每张图片重复次数')
+    parser.add_argument('--max-side', type=int, default=None,
+                        help='检测工作分辨率长边（默认使用 DETECTION_MAX_SIDE，0表示不缩放）')
+    parser.add_argument('--time-nms', action='store_true',
+                        help='只对比向量化NMS与原实现的耗时')
+    args = parser.parse_args()
+
+    if args.time_nms:
+        time_nms()
+        return
+
+    app.load_face_detector()
+    if args.max_side is not None:
+        app.DETECTION_MAX_SIDE = args.max_side
+
+    if args.images:
+        images = load_images(args.images)
+    else:
+        images = [(f'synthetic_{w}x{h}', make_synthetic_image(w, h, seed=i))
+                  for i, (w, h) in enumerate(DEFAULT_SIZES)]
+
+    print("=" * 60)
+    print("人脸检测性能测试")
+    print(f"检测工作分辨率长边: {app.DETECTION_MAX_SIDE or '不缩放'}")
+    print("=" * 60)
+
+    totals = {mode: 0.0 for mode in MODES}
+    total_mp = 0.0
+    recalls = []
+
+    for name, image in images:
+        megapixels = image.width * image.height / 1e6
+        total_mp += megapixels
+
+        results = {}
+        for mode in MODES:
+            elapsed, faces = time_detection(image, mode, args.repeat)
+            totals[mode] += elapsed
+            results[mode] = (elapsed, faces)
+
+        r = recall(face_boxes(results['multi_pass'][1], image),
+                   face_boxes(results['single_pass'][1], image))
+        recalls.append(r)
+
+        print(f"\n{name} ({image.width}x{image.height}, {megapixels:.2f} MP)")
+        for mode in MODES:
+            elapsed, faces = results[mode]
+            print(f"  {mode:12s} {elapsed * 1000:8.1f} ms  "
+                  f"{elapsed * 1000 / megapixels:8.1f} ms/MP  {len(faces)} 个框")
+        print(f"  single_pass 召回率: {r:.2%}")
+
+    print("\n" + "=" * 60)
+    for mode in MODES:
+        print(f"{mode:12s} 平均 {totals[mode] * 1000 / total_mp:8.1f} ms/MP")
+    print(f"加速比: {totals['multi_pass'] / totals['single_pass']:.2f}x")
+    print(f"平均召回率: {np.mean(recalls):.2%}")
+    print("=" * 60)
+
+if __name__ == '__main__':
+    main()
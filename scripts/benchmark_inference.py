@@ -0,0 +1,308 @@
+"""
+V2推理性能基准测试
+在固定的测试图片集上测量以下函数的吞吐量和 p50/p95/p99 延迟：
+    detect_faces                 人脸检测（按线程数）
+    merge_overlapping_boxes      检测框去重（按检测框数量）
+    predict_image / predict_batch  角色识别（按批次大小，批次大小1即 predict_image）
+    predict_with_face_detection  端到端识别（按线程数）
+
+测试图片默认按固定随机种子合成（多种分辨率 × 人脸数，画出的人脸可以被Haar检测器检测到），
+每次运行完全相同；也可以用 --images 指定真实图片目录。
+结果保存为JSON（包含提交号、版本和配置），--compare 与之前的结果对比，
+--fail-threshold 设置后吞吐量下降或p95延迟上升超过该比例时以非0状态退出
+
+用法（在项目根目录运行）:
+    python scripts/benchmark_inference.py --output bench.json
+    python scripts/benchmark_inference.py --threads 1,2,4 --batch-sizes 1,8,32 --iterations 30
+    python scripts/benchmark_inference.py --compare bench.json --fail-threshold 0.1
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+import torch
+from PIL import Image
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+import recognition_app_v2 as app
+from benchmark_detection import load_images, random_boxes
+
+# 合成测试图片的分辨率（宽, 高）和人脸数
+CORPUS_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+CORPUS_FACES = [0, 1, 3, 6]
+
+# merge_overlapping_boxes 的输入检测框数量
+NMS_BOX_COUNTS = [10, 50, 200]
+
+def draw_face(img, cx, cy, size):
+    """画一张简化的正面人脸（脸、眼睛、眉毛、鼻子、嘴）"""
+    s = size
+    cv2.ellipse(img, (cx, cy), (int(s * 0.42), int(s * 0.55)), 0, 0, 360, (225, 200, 190), -1)
+    for dx in (-1, 1):
+        cv2.ellipse(img, (cx + int(dx * s * 0.17), cy - int(s * 0.12)),
+                    (int(s * 0.09), int(s * 0.05)), 0, 0, 360, (40, 40, 40), -1)
+        cv2.line(img, (cx + int(dx * s * 0.08), cy - int(s * 0.24)),
+                 (cx + int(dx * s * 0.27), cy - int(s * 0.24)), (50, 50, 60), max(1, s // 25))
+    cv2.line(img, (cx, cy - int(s * 0.05)), (cx, cy + int(s * 0.12)), (180, 150, 150), max(1, s // 30))
+    cv2.ellipse(img, (cx, cy + int(s * 0.27)), (int(s * 0.15), int(s * 0.05)), 0, 0, 360, (150, 70, 90), -1)
+
+def make_corpus_image(width, height, faces, seed):
+    """平滑背景上按网格放置指定数量的人脸"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 140, (height, width, 3), dtype=np.uint8)
+    img = cv2.GaussianBlur(background, (0, 0), max(2, width // 160))
+
+    if faces > 0:
+        cols = min(faces, 3)
+        rows = (faces + cols - 1) // cols
+        size = int(min(width / (cols + 1), height / (rows + 0.5)) * 0.6)
+        for i in range(faces):
+            row, col = divmod(i, cols)
+            cx = int(width * (col + 1) / (cols + 1) + rng.integers(-size // 8, size // 8 + 1))
+            cy = int(height * (row + 0.5) / rows + rng.integers(-size // 8, size // 8 + 1))
+            draw_face(img, cx, cy, size)
+
+    return Image.fromarray(img)
+
+def build_corpus():
+    """固定的合成测试图片集: [(名称, 图片), ...]"""
+    corpus = []
+    for i, (width, height) in enumerate(CORPUS_SIZES):
+        for faces in CORPUS_FACES:
+            name = f'{width}x{height}_faces{faces}'
+            corpus.append((name, make_corpus_image(width, height, faces, seed=i * 100 + faces)))
+    return corpus
+
+def face_crops(corpus, count):
+    """从测试图片中截取人脸区域，作为识别的输入（与端到端识别的输入分布一致）"""
+    crops = []
+    for _, image in corpus:
+        with contextlib.redirect_stdout(io.StringIO()):
+            faces = app.detect_faces(image)
+        for x, y, w, h, _ in faces:
+            x, y, w, h = app.expand_bbox(x, y, w, h, image.width, image.height, expand_ratio=0.5)
+            crops.append(image.crop((x, y, x + w, y + h)))
+    while len(crops) < count:
+        crops.extend(crops[:count - len(crops)])
+    return crops[:count]
+
+def summarize(latencies, wall_seconds, items):
+    """延迟分位数（毫秒）和吞吐量（每秒处理的项数）"""
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'iterations': len(latencies),
+        'throughput': items / wall_seconds if wall_seconds > 0 else 0.0,
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99))
+    }
+
+def run_case(fn, inputs, iterations, threads=1, warmup=2, items_per_call=1):
+    """
+    用 threads 个线程并发调用 fn 共 iterations 次（输入循环使用），
+    返回每次调用的延迟分位数和整体吞吐量
+    """
+    def timed(arg):
+        started = time.perf_counter()
+        fn(arg)
+        return time.perf_counter() - started
+
+    work = [inputs[i % len(inputs)] for i in range(iterations)]
+    # 应用内部的检测和识别会输出日志，测量期间丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            # 预热每个线程（各线程第一次检测时需要加载自己的检测器）
+            list(pool.map(timed, [inputs[i % len(inputs)] for i in range(warmup * threads)]))
+            started = time.perf_counter()
+            latencies = list(pool.map(timed, work))
+            wall_seconds = time.perf_counter() - started
+    return summarize(latencies, wall_seconds, iterations * items_per_call)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    """运行环境（对比结果时只有环境相同才有意义）"""
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+        'device': str(app.device)
+    }
+
+def configuration():
+    """影响性能的应用配置"""
+    return {
+        'backend': app.INFERENCE_BACKEND,
+        'model_version': app.current_model().version,
+        'detection_mode': app.DETECTION_MODE,
+        'detection_max_side': app.DETECTION_MAX_SIDE,
+        'fused_preprocess': app.FUSED_PREPROCESS,
+        'micro_batching': app.batcher is not None,
+        'pipeline': app.pipeline is not None
+    }
+
+def format_params(result):
+    return ', '.join(f'{key}={result[key]}' for key in ('threads', 'batch_size', 'boxes') if key in result)
+
+def print_row(result):
+    print(f"  {result['case']:24s} {format_params(result):22s} {result['throughput']:9.1f}/s  "
+          f"p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms")
+
+def run_benchmarks(corpus, args):
+    results = []
+
+    def add(benchmark, case, summary, **params):
+        result = dict(benchmark=benchmark, case=case, **params, **summary)
+        results.append(result)
+        print_row(result)
+
+    print("\n[detect_faces]")
+    # 实际检测到的人脸数（合成图片的人脸是否都被检测到）
+    with contextlib.redirect_stdout(io.StringIO()):
+        detected = {name: len(app.detect_faces(image, fallback=False)) for name, image in corpus}
+    for threads in args.threads:
+        for name, image in corpus:
+            summary = run_case(app.detect_faces, [image], args.iterations, threads)
+            add('detect_faces', name, summary, threads=threads, faces_detected=detected[name])
+
+    print("\n[merge_overlapping_boxes]")
+    rng = np.random.default_rng(0)
+    for count in NMS_BOX_COUNTS:
+        inputs = [random_boxes(rng, count) for _ in range(8)]
+        summary = run_case(app.merge_overlapping_boxes, inputs, args.iterations * 10)
+        add('merge_overlapping_boxes', f'boxes{count}', summary, boxes=count)
+
+    print("\n[predict_image / predict_batch]")
+    crops = face_crops(corpus, max(args.batch_sizes) * 4)
+    for batch_size in args.batch_sizes:
+        if batch_size == 1:
+            fn, inputs = app.predict_image, crops
+        else:
+            fn = app.predict_batch
+            inputs = [crops[i:i + batch_size] for i in range(0, len(crops) - batch_size + 1, batch_size)]
+        summary = run_case(fn, inputs, args.iterations, items_per_call=batch_size)
+        add('predict_image', 'face_crops', summary, batch_size=batch_size)
+
+    print("\n[predict_with_face_detection]")
+    for threads in args.threads:
+        for name, image in corpus:
+            summary = run_case(app.predict_with_face_detection, [image], args.iterations, threads)
+            add('predict_with_face_detection', name, summary, threads=threads)
+
+    return results
+
+def result_key(result):
+    return (result['benchmark'], result['case'], result.get('threads'),
+            result.get('batch_size'), result.get('boxes'))
+
+def compare(results, baseline_path, fail_threshold):
+    """与之前的结果对比，返回超出阈值的退化项"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {result_key(r): r for r in baseline['results']}
+
+    print("\n" + "=" * 60)
+    print(f"与 {baseline_path}（提交 {baseline['environment'].get('commit')}）对比")
+    print("=" * 60)
+    if baseline['environment'].get('cpu_count') != os.cpu_count():
+        print("⚠ CPU核数与基准结果不同，对比结果仅供参考")
+
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        throughput_change = result['throughput'] / old['throughput'] - 1 if old['throughput'] else 0.0
+        p95_change = result['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+        regressed = fail_threshold is not None and (
+            throughput_change < -fail_threshold or p95_change > fail_threshold)
+        marker = '✗' if regressed else ' '
+        print(f"{marker} {result['benchmark']:28s} {result['case']:18s} {format_params(result):14s} "
+              f"吞吐量 {throughput_change:+7.1%}  p95 {p95_change:+7.1%}")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+def parse_list(value):
+    return sorted({int(v) for v in value.split(',') if v.strip()})
+
+def main():
+    default_threads = ','.join(str(n) for n in sorted({1, min(4, os.cpu_count() or 1)}))
+    parser = argparse.ArgumentParser(description='V2推理性能基准测试')
+    parser.add_argument('--images', help='测试图片目录（默认使用固定的合成图片）')
+    parser.add_argument('--save-corpus', help='把合成的测试图片保存到该目录')
+    parser.add_argument('--iterations', type=int, default=20, help='每个测试项的调用次数')
+    parser.add_argument('--threads', type=parse_list, default=parse_list(default_threads),
+                        help=f'并发线程数，逗号分隔（默认 {default_threads}）')
+    parser.add_argument('--batch-sizes', type=parse_list, default=parse_list('1,8,32'),
+                        help='识别的批次大小，逗号分隔（默认 1,8,32）')
+    parser.add_argument('--output', help='结果保存为JSON文件')
+    parser.add_argument('--compare', help='与之前保存的JSON结果对比')
+    parser.add_argument('--fail-threshold', type=float,
+                        help='吞吐量下降或p95延迟上升超过该比例（如0.1）时以非0状态退出')
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.create_app()
+
+    if args.images:
+        corpus = load_images(args.images)
+    else:
+        corpus = build_corpus()
+        if args.save_corpus:
+            os.makedirs(args.save_corpus, exist_ok=True)
+            for name, image in corpus:
+                image.save(os.path.join(args.save_corpus, f'{name}.png'))
+
+    env = environment()
+    print("=" * 60)
+    print("V2推理性能基准测试")
+    print("=" * 60)
+    print(f"提交: {env['commit']}  CPU核数: {env['cpu_count']}  torch线程数: {env['torch_threads']}")
+    print(f"测试图片: {len(corpus)} 张  每项调用次数: {args.iterations}")
+
+    results = run_benchmarks(corpus, args)
+
+    report = {
+        'environment': env,
+        'configuration': configuration(),
+        'parameters': {'iterations': args.iterations, 'threads': args.threads,
+                       'batch_sizes': args.batch_sizes, 'images': args.images or 'synthetic'},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.fail_threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} 项性能退化超过 {args.fail_threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
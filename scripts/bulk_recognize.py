@@ -0,0 +1,193 @@
+"""
+离线批量识别
+不经过Flask，直接用V2的两阶段方案（detect_faces + expand_bbox + 分类模型）识别整个目录树中的图片，
+结果逐行追加写入JSONL文件
+
+- 流式遍历目录，不需要事先列出所有文件
+- 解码和人脸检测在线程池中并行（OpenCV检测时会释放GIL）
+- 多张图片的人脸区域凑成大批次统一识别
+- 输出文件本身就是断点：重新运行时跳过已经成功写入的图片，中断后可以继续
+
+用法（在项目根目录运行）:
+    python scripts/bulk_recognize.py 图片目录 results.jsonl --workers 8 --batch-size 128
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from PIL import Image
+
+# 从项目根目录导入V2应用
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recognition_app_v2 as app
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+def iter_images(root):
+    """按固定顺序流式遍历目录树中的图片，返回相对路径"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.relpath(os.path.join(dirpath, name), root)
+
+def truncate_partial_line(f, chunk_size=64 * 1024):
+    """
+    从文件末尾向前按块查找最后一个换行，截掉其后写了一半的内容
+    返回: 截掉的字节数
+    """
+    size = f.seek(0, os.SEEK_END)
+    end = size
+    while end > 0:
+        start = max(0, end - chunk_size)
+        f.seek(start)
+        index = f.read(end - start).rfind(b'\n')
+        if index >= 0:
+            end = start + index + 1
+            break
+        end = start
+
+    if end < size:
+        f.truncate(end)
+    return size - end
+
+def load_checkpoint(output_path):
+    """
+    逐行读取已有的输出文件，返回已经成功处理的图片路径集合
+    上次中断时写了一半的最后一行会被截掉；出错的图片不计入，重新运行时会重试
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, 'rb+') as f:
+        truncated = truncate_partial_line(f)
+    if truncated:
+        print(f"截掉输出文件末尾不完整的一行（{truncated} 字节）")
+
+    with open(output_path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'error' not in record:
+                done.add(record['path'])
+    return done
+
+def decode_and_detect(root, rel_path):
+    """工作线程：解码图片并完成检测和区域预处理"""
+    try:
+        with Image.open(os.path.join(root, rel_path)) as image:
+            image, regions, batch = app.detect_regions(image)
+        return rel_path, image.size, regions, batch, None
+    except Exception as e:
+        return rel_path, None, None, None, str(e)
+
+def flush_batch(pending, output):
+    """识别凑好的一批图片并写入输出文件"""
+    stages = [item for item in pending if item[4] is None]
+    batch_results = []
+    if stages:
+        batch = torch.cat([batch for _, _, _, batch, _ in stages])
+        batch_results = app.classify_regions(batch, top_k=5)
+
+    offset = 0
+    for rel_path, size, regions, _, error in pending:
+        if error is not None:
+            record = {'path': rel_path, 'error': error}
+        else:
+            results = batch_results[offset:offset + len(regions)]
+            offset += len(regions)
+            detections = app.build_detections(size, regions, results)
+            record = {
+                'path': rel_path,
+                'width': size[0],
+                'height': size[1],
+                'num_faces': len(detections),
+                'detections': detections
+            }
+        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    output.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='离线批量识别目录中的图片')
+    parser.add_argument('input_dir', help='图片目录（递归遍历）')
+    parser.add_argument('output', help='输出JSONL文件（已存在时从断点继续）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='解码和检测的线程数')
+    parser.add_argument('--batch-size', type=int, default=128,
+                        help='每批识别的人脸区域数（即每次前向传播的批次大小）')
+    args = parser.parse_args()
+
+    # predict_tensor 按 MAX_BATCH_SIZE（服务默认32）分块前向传播，离线识别使用更大的批次
+    app.MAX_BATCH_SIZE = args.batch_size
+
+    print("=" * 60)
+    print("离线批量识别")
+    print("=" * 60)
+
+    app.load_face_detector()
+    app.load_model()
+
+    done = load_checkpoint(args.output)
+    if done:
+        print(f"从断点继续: 已完成 {len(done)} 张")
+
+    processed = 0
+    failed = 0
+    start = time.time()
+
+    with open(args.output, 'a', encoding='utf-8') as output, \
+            ThreadPoolExecutor(max_workers=args.workers) as executor:
+        # 限制同时在处理中的图片数，保持输出顺序并控制内存
+        in_flight = deque()
+        max_in_flight = args.workers * 4
+        pending = []
+        pending_regions = 0
+
+        def collect(future):
+            nonlocal pending_regions, processed, failed
+            item = future.result()
+            pending.append(item)
+            processed += 1
+            if item[4] is not None:
+                failed += 1
+            else:
+                pending_regions += len(item[2])
+
+        for rel_path in iter_images(args.input_dir):
+            if rel_path in done:
+                continue
+
+            in_flight.append(executor.submit(decode_and_detect, args.input_dir, rel_path))
+            if len(in_flight) >= max_in_flight:
+                collect(in_flight.popleft())
+
+            if pending_regions >= args.batch_size:
+                flush_batch(pending, output)
+                pending.clear()
+                pending_regions = 0
+                elapsed = time.time() - start
+                print(f"已处理 {processed} 张（失败 {failed}），{processed / elapsed:.1f} 张/秒")
+
+        while in_flight:
+            collect(in_flight.popleft())
+        if pending:
+            flush_batch(pending, output)
+
+    elapsed = time.time() - start
+    print("=" * 60)
+    print(f"✓ 完成: 本次处理 {processed} 张（失败 {failed}），用时 {elapsed:.1f} 秒")
+    print(f"✓ 结果: {args.output}")
+    print("=" * 60)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+推理后端对比：PyTorch vs ONNX Runtime
+对比不同批次大小下两个后端的前向传播延迟（输出一致性由 tests/test_onnx_backend.py 校验）
+
+样本优先使用 classification_dataset/val 中的图片，没有时使用合成图片
+需要先运行: python scripts/export_model.py --onnx
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+from PIL import Image
+
+# 从项目根目录导入V2应用
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recognition_app_v2 as app
+
+VAL_DIR = os.path.join("classification_dataset", "val")
+BATCH_SIZES = [1, 8, 32]
+
+def load_samples(limit):
+    """加载验证集图片作为样本，没有验证集时生成合成图片"""
+    samples = []
+    if os.path.isdir(VAL_DIR):
+        for class_name in sorted(os.listdir(VAL_DIR)):
+            class_dir = os.path.join(VAL_DIR, class_name)
+            for name in sorted(os.listdir(class_dir)):
+                samples.append(Image.open(os.path.join(class_dir, name)).convert('RGB'))
+                if len(samples) >= limit:
+                    return samples
+        if samples:
+            return samples
+
+    print(f"未找到 {VAL_DIR}，使用合成图片")
+    rng = np.random.default_rng(0)
+    for _ in range(limit):
+        h, w = rng.integers(64, 400, size=2)
+        samples.append(Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8)))
+    return samples
+
+def load_backend(name):
+    """以指定后端加载模型，返回可调用的模型对象"""
+    app.INFERENCE_BACKEND = name
+    app.load_model()
+    return app.current_model().model
+
+def time_forward(model, batch, repeat):
+    """返回单次前向传播的平均耗时（秒）"""
+    with torch.no_grad():
+        model(batch)  # 预热
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model(batch)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description='推理后端对比')
+    parser.add_argument('--samples', type=int, default=64, help='样本数量')
+    parser.add_argument('--repeat', type=int, default=10, help='每个批次大小重复次数')
+    args = parser.parse_args()
+
+    backends = {name: load_backend(name) for name in ['torch', 'onnx']}
+
+    samples = load_samples(args.samples)
+    inputs = torch.stack([app.get_transform()(image) for image in samples])
+
+    print("\n" + "=" * 60)
+    print("前向传播延迟")
+    print("=" * 60)
+
+    for batch_size in BATCH_SIZES:
+        batch = inputs[:batch_size]
+        if len(batch) < batch_size:
+            batch = inputs[torch.arange(batch_size) % len(inputs)]
+        timings = {name: time_forward(model, batch, args.repeat) for name, model in backends.items()}
+        print(f"batch={batch_size:3d}  "
+              f"torch {timings['torch'] * 1000:8.1f} ms  "
+              f"onnx {timings['onnx'] * 1000:8.1f} ms  "
+              f"加速比 {timings['torch'] / timings['onnx']:.2f}x")
+
+if __name__ == '__main__':
+    main()
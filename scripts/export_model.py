@@ -0,0 +1,79 @@
+"""
+将已训练好的 models/best_model.pth 导出为TorchScript推理模型
+（训练脚本在保存模型时会自动导出，此脚本用于已有的模型文件）
+
+--onnx: 同时导出ONNX模型，供 PGR_BACKEND=onnx 的ONNX Runtime后端使用
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import torch
+import torch.nn as nn
+from torchvision import models
+
+# 从项目根目录导入训练脚本中的导出函数
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train_classification_model import export_torchscript, export_onnx
+
+MODELS_DIR = "models"
+MODEL_PATH = os.path.join(MODELS_DIR, "best_model.pth")
+CLASS_NAMES_PATH = os.path.join(MODELS_DIR, "class_names.json")
+TORCHSCRIPT_PATH = os.path.join(MODELS_DIR, "best_model.torchscript.pt")
+ONNX_PATH = os.path.join(MODELS_DIR, "best_model.onnx")
+
+def load_trained_model():
+    """加载训练好的ResNet18权重"""
+    with open(CLASS_NAMES_PATH, 'r', encoding='utf-8') as f:
+        class_names = json.load(f)
+    
+    model = models.resnet18(pretrained=False)
+    model.fc = nn.Linear(model.fc.in_features, len(class_names))
+    model.load_state_dict(torch.load(MODEL_PATH, map_location='cpu', weights_only=True))
+    model.eval()
+    return model
+
+def check_onnx(model):
+    """校验ONNX Runtime的输出与原模型一致"""
+    import onnxruntime as ort
+    
+    session = ort.InferenceSession(ONNX_PATH, providers=['CPUExecutionProvider'])
+    example = torch.randn(4, 3, 224, 224)
+    outputs = session.run(None, {session.get_inputs()[0].name: example.numpy()})[0]
+    with torch.no_grad():
+        return (torch.from_numpy(outputs) - model(example)).abs().max().item()
+
+def main():
+    parser = argparse.ArgumentParser(description='导出推理模型')
+    parser.add_argument('--onnx', action='store_true', help='同时导出ONNX模型')
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("导出TorchScript模型")
+    print("=" * 60)
+    
+    if not os.path.exists(MODEL_PATH):
+        print(f"✗ 找不到模型文件: {MODEL_PATH}")
+        sys.exit(1)
+    
+    model = load_trained_model()
+    export_torchscript(model, TORCHSCRIPT_PATH)
+    
+    # 校验导出结果与原模型一致
+    example = torch.randn(4, 3, 224, 224)
+    exported = torch.jit.load(TORCHSCRIPT_PATH)
+    with torch.no_grad():
+        max_diff = (exported(example) - model(example)).abs().max().item()
+    
+    print(f"✓ TorchScript模型: {TORCHSCRIPT_PATH}")
+    print(f"✓ 与原模型最大输出误差: {max_diff:.2e}")
+    
+    if args.onnx:
+        export_onnx(model, ONNX_PATH)
+        print(f"✓ ONNX模型: {ONNX_PATH}")
+        print(f"✓ 与原模型最大输出误差: {check_onnx(model):.2e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+"""
+识别服务HTTP压力测试
+对 /api/recognize 以固定并发（闭环，每个客户端收到响应后立即发下一个请求）
+或固定请求速率（开环，按计划时间发送，延迟从计划时间算起，服务变慢时不会少发请求）施加压力，
+按时间段输出持续RPS、延迟分位数、错误率和服务进程的内存占用
+
+可以逐级增加并发/速率（如 --concurrency 1,2,4,8,16），找出请求堆积时延迟陡增的拐点，用于评估单机容量。
+--sweep 依次以不同的 worker数 × 每个worker的计算线程数（torch/OpenCV/BLAS）启动gunicorn并测试，
+比较各布局的最高吞吐量（--pin 同时把各worker绑定到各自的CPU核）
+服务可以由本脚本启动（--server flask / gunicorn / asgi），也可以是已经运行的服务（--url）；
+由本脚本启动时统计服务进程树的内存（Linux，按PSS统计，多worker共享的页面不重复计算）
+
+每个请求在图片末尾附加随机字节（不影响解码），避免命中结果缓存；--allow-cache 关闭该行为
+
+用法（在项目根目录运行）:
+    python scripts/load_test.py --server gunicorn --workers 2 --threads 2 --concurrency 1,2,4,8 --duration 30
+    python scripts/load_test.py --server asgi --rate 2,4,8 --duration 60 --output load.json
+    python scripts/load_test.py --url http://127.0.0.1:5000 --images 测试图片目录 --concurrency 4
+    python scripts/load_test.py --server gunicorn --sweep 1x4,2x2,4x1 --pin --concurrency 4,8
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 由本脚本启动服务时的启动命令
+SERVER_COMMANDS = {
+    'flask': [sys.executable, '-c',
+              'import sys; sys.path.insert(0, sys.argv[1]); import recognition_app_v2 as app; '
+              'app.create_app().run(host="127.0.0.1", port=int(sys.argv[2]), threaded=True)',
+              PROJECT_ROOT, '{port}'],
+    'gunicorn': [sys.executable, os.path.join(PROJECT_ROOT, 'serve_v2.py'), '--bind', '127.0.0.1:{port}',
+                 '--workers', '{workers}', '--threads', '{threads}'],
+    'asgi': [sys.executable, os.path.join(PROJECT_ROOT, 'asgi_app_v2.py'), '--bind', '127.0.0.1:{port}'],
+}
+
+def load_corpus(image_dir):
+    """读取测试图片（原始字节）；未指定目录时使用基准测试的合成图片"""
+    corpus = []
+    if image_dir:
+        for name in sorted(os.listdir(image_dir)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                with open(os.path.join(image_dir, name), 'rb') as f:
+                    corpus.append((name, f.read()))
+        return corpus
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from benchmark_inference import build_corpus
+    for name, image in build_corpus():
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        corpus.append((f'{name}.jpg', buffer.getvalue()))
+    return corpus
+
+def encode_multipart(filename, image_bytes):
+    """编码为 multipart/form-data 请求体"""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode('utf-8') + image_bytes + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+class Client:
+    """每个线程一个保持连接的HTTP客户端"""
+
+    def __init__(self, url, corpus, allow_cache, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path.rstrip('/') or '') + '/api/recognize'
+        self.corpus = corpus
+        self.allow_cache = allow_cache
+        self.timeout = timeout
+        self._local = threading.local()
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _next_request(self):
+        with self._lock:
+            index = self._counter
+            self._counter += 1
+        filename, image_bytes = self.corpus[index % len(self.corpus)]
+        if not self.allow_cache:
+            image_bytes = image_bytes + os.urandom(16)
+        return encode_multipart(filename, image_bytes)
+
+    def send(self):
+        """发送一个识别请求，返回状态（HTTP状态码或异常名）"""
+        body, content_type = self._next_request()
+        conn = self._connection()
+        try:
+            conn.request('POST', self.path, body, {'Content-Type': content_type})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            self._local.conn = None
+            return type(e).__name__
+
+def process_tree(root_pid):
+    """root_pid 及其所有子进程的pid（读取 /proc）"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 进程名可能包含空格，从最后一个右括号之后解析
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+def memory_mb(root_pid):
+    """进程树的内存占用（MB）：优先使用PSS（共享页面按进程数分摊），否则使用RSS"""
+    total_kb = 0
+    for pid in process_tree(root_pid):
+        for path, field in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+            try:
+                with open(path) as f:
+                    value = next((line.split()[1] for line in f if line.startswith(field)), None)
+            except OSError:
+                continue
+            if value is not None:
+                total_kb += int(value)
+                break
+    return total_kb / 1024
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(kind, workers, threads, startup_timeout, env=None):
+    """启动服务并等待就绪，返回 (进程, 地址, 日志文件路径)"""
+    port = free_port()
+    command = [part.format(port=port, workers=workers, threads=threads) for part in SERVER_COMMANDS[kind]]
+    log = tempfile.NamedTemporaryFile(prefix=f'load_test_{kind}_', suffix='.log', delete=False)
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=dict(os.environ, **(env or {})))
+
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败，日志: {log.name}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/model_info')
+            if conn.getresponse().status in (200, 500):
+                return process, f'http://127.0.0.1:{port}', log.name
+        except OSError:
+            pass
+        time.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError(f"服务在 {startup_timeout} 秒内未就绪，日志: {log.name}")
+
+def run_closed_loop(client, concurrency, duration):
+    """固定并发：每个客户端线程收到响应后立即发送下一个请求"""
+    records = []
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = client.send()
+            records.append((started, time.perf_counter(), status))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+def run_open_loop(client, rate, duration, max_inflight, seed):
+    """
+    固定速率：按泊松到达的计划时间发送请求
+    延迟从计划发送时间算起（客户端线程不够时排队的时间也计入），服务变慢时不会因此少发请求
+    """
+    records = []
+    rng = np.random.default_rng(seed)
+
+    def send(scheduled):
+        status = client.send()
+        records.append((scheduled, time.perf_counter(), status))
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        started = time.perf_counter()
+        scheduled = started
+        while True:
+            scheduled += rng.exponential(1.0 / rate)
+            if scheduled - started >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled)
+    return records
+
+def summarize(records, started, ended):
+    """一段时间内完成的请求的RPS、延迟分位数（毫秒）和错误率"""
+    latencies = np.array([(end - start) * 1000 for start, end, status in records if status == 200])
+    errors = {}
+    for _, _, status in records:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+
+    elapsed = max(ended - started, 1e-9)
+    summary = {
+        'requests': len(records),
+        'rps': len(latencies) / elapsed,
+        'error_rate': (len(records) - len(latencies)) / len(records) if records else 0.0,
+        'errors': errors
+    }
+    for name, q in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99)):
+        summary[name] = float(np.percentile(latencies, q)) if len(latencies) else None
+    summary['max_ms'] = float(latencies.max()) if len(latencies) else None
+    return summary
+
+def run_step(client, mode, level, args, server_pid):
+    """运行一级压力，按时间段统计（按请求完成时间分段）"""
+    memory = []
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.is_set():
+            memory.append((time.perf_counter(), memory_mb(server_pid)))
+            stop.wait(args.interval)
+
+    sampler = None
+    if server_pid is not None:
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+
+    started = time.perf_counter()
+    if mode == 'concurrency':
+        records = run_closed_loop(client, level, args.duration)
+    else:
+        records = run_open_loop(client, level, args.duration, args.max_inflight, args.seed)
+    ended = time.perf_counter()
+
+    stop.set()
+    if sampler is not None:
+        sampler.join()
+        memory.append((ended, memory_mb(server_pid)))
+
+    timeline = []
+    window_start = started
+    while window_start < ended:
+        window_end = min(window_start + args.interval, ended)
+        window = [r for r in records if window_start <= r[1] < window_end]
+        point = summarize(window, window_start, window_end)
+        point['t'] = window_start - started
+        samples = [mb for t, mb in memory if t < window_end]
+        point['memory_mb'] = samples[-1] if samples else None
+        timeline.append(point)
+        window_start = window_end
+
+    result = {mode: level, **summarize(records, started, ended), 'timeline': timeline}
+    if memory:
+        result['memory_start_mb'] = memory[0][1]
+        result['memory_end_mb'] = memory[-1][1]
+        result['memory_growth_mb'] = memory[-1][1] - memory[0][1]
+    return result
+
+def format_ms(value):
+    return f'{value:8.0f}' if value is not None else '       -'
+
+def print_step(mode, result):
+    memory = ''
+    if 'memory_end_mb' in result:
+        memory = f"  内存 {result['memory_end_mb']:7.0f} MB ({result['memory_growth_mb']:+.0f})"
+    label = '并发' if mode == 'concurrency' else '速率'
+    print(f"{label} {result[mode]:>5}  RPS {result['rps']:6.2f}  "
+          f"p50 {format_ms(result['p50_ms'])}  p95 {format_ms(result['p95_ms'])}  "
+          f"p99 {format_ms(result['p99_ms'])} ms  错误率 {result['error_rate']:6.1%}{memory}")
+    if result['errors']:
+        print(f"           错误: {result['errors']}")
+
+def parse_levels(value):
+    return [float(v) if '.' in v else int(v) for v in value.split(',') if v.strip()]
+
+def parse_layouts(value):
+    """'1x4,2x2' -> [(1, 4), (2, 2)]（worker数 × 每个worker的计算线程数）"""
+    layouts = []
+    for part in value.split(','):
+        if part.strip():
+            workers, threads = part.lower().split('x')
+            layouts.append((int(workers), int(threads)))
+    return layouts
+
+def run_levels(url, process, corpus, mode, levels, args):
+    """预热后逐级施加压力，返回每一级的结果"""
+    client = Client(url, corpus, args.allow_cache, args.timeout)
+    for _ in range(args.warmup):
+        client.send()
+
+    print("=" * 60)
+    print(f"压力测试: {url}/api/recognize  测试图片 {len(corpus)} 张  每级 {args.duration:.0f} 秒")
+    print("=" * 60)
+
+    results = []
+    for level in levels:
+        result = run_step(client, mode, level, args, process.pid if process else None)
+        results.append(result)
+        print_step(mode, result)
+    return results
+
+def run_sweep(corpus, mode, levels, args):
+    """依次测试每种 worker数 × 计算线程数 的布局，返回各布局的结果"""
+    layouts = []
+    for workers, compute_threads in args.sweep:
+        env = {name: str(compute_threads) for name in ('PGR_TORCH_THREADS', 'PGR_OPENCV_THREADS', 'PGR_BLAS_THREADS')}
+        if args.pin:
+            env['PGR_CPU_AFFINITY'] = 'auto'
+        print(f"\n布局 {workers}x{compute_threads}: {workers} 个worker × 每个 {compute_threads} 个计算线程"
+              + ("（绑定CPU核）" if args.pin else ""))
+        process, url, _ = start_server('gunicorn', workers, args.threads, args.startup_timeout, env)
+        try:
+            steps = run_levels(url, process, corpus, mode, levels, args)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        best = max(steps, key=lambda step: step['rps'])
+        layouts.append({'workers': workers, 'compute_threads': compute_threads, 'best': best, 'steps': steps})
+
+    print("\n" + "=" * 60)
+    print("各布局的最高吞吐量")
+    print("=" * 60)
+    for layout in sorted(layouts, key=lambda layout: layout['best']['rps'], reverse=True):
+        best = layout['best']
+        memory = f"  内存 {best['memory_end_mb']:7.0f} MB" if 'memory_end_mb' in best else ''
+        print(f"{layout['workers']:>2} x {layout['compute_threads']:<2}  RPS {best['rps']:6.2f}"
+              f"（{'并发' if mode == 'concurrency' else '速率'} {best[mode]}）  "
+              f"p95 {format_ms(best['p95_ms'])} ms  错误率 {best['error_rate']:6.1%}{memory}")
+    return layouts
+
+def main():
+    parser = argparse.ArgumentParser(description='识别服务HTTP压力测试')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='已运行的服务地址，如 http://127.0.0.1:5000')
+    target.add_argument('--server', choices=sorted(SERVER_COMMANDS), help='由本脚本启动的服务类型')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker数')
+    parser.add_argument('--threads', type=int, default=2, help='gunicorn 每个worker的线程数')
+    parser.add_argument('--sweep', type=parse_layouts,
+                        help='依次测试的 worker数x计算线程数 布局，如 1x4,2x2,4x1（需要 --server gunicorn）')
+    parser.add_argument('--pin', action='store_true', help='--sweep 时把各worker绑定到各自的CPU核')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=parse_levels, help='并发客户端数，逗号分隔时逐级测试（默认 1,2,4,8）')
+    load.add_argument('--rate', type=parse_levels, help='每秒请求数，逗号分隔时逐级测试')
+    parser.add_argument('--duration', type=float, default=30, help='每一级的持续时间（秒）')
+    parser.add_argument('--interval', type=float, default=5, help='统计时间段长度（秒）')
+    parser.add_argument('--warmup', type=int, default=5, help='正式测试前发送的预热请求数')
+    parser.add_argument('--images', help='测试图片目录（默认使用合成图片）')
+    parser.add_argument('--allow-cache', action='store_true', help='不附加随机字节，允许命中结果缓存')
+    parser.add_argument('--max-inflight', type=int, default=256, help='固定速率时最多同时进行的请求数')
+    parser.add_argument('--timeout', type=float, default=60, help='单个请求的超时时间（秒）')
+    parser.add_argument('--startup-timeout', type=float, default=180, help='等待服务就绪的时间（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='固定速率时请求间隔的随机种子')
+    parser.add_argument('--output', help='结果（含每个时间段的统计）保存为JSON文件')
+    args = parser.parse_args()
+
+    mode, levels = ('rate', args.rate) if args.rate else ('concurrency', args.concurrency or [1, 2, 4, 8])
+    if args.sweep and args.server != 'gunicorn':
+        parser.error('--sweep 需要 --server gunicorn')
+
+    corpus = load_corpus(args.images)
+    if not corpus:
+        print("✗ 没有测试图片")
+        sys.exit(1)
+
+    report = {
+        'server': args.server,
+        'threads': args.threads if args.server == 'gunicorn' else None,
+        'mode': mode,
+        'duration': args.duration,
+        'images': args.images or 'synthetic',
+        'cpu_count': os.cpu_count()
+    }
+
+    if args.sweep:
+        report['pin'] = args.pin
+        report['layouts'] = run_sweep(corpus, mode, levels, args)
+    else:
+        process = None
+        url = args.url
+        if args.server:
+            print(f"正在启动服务: {args.server} ...")
+            process, url, log_path = start_server(args.server, args.workers, args.threads, args.startup_timeout)
+            print(f"服务已就绪: {url}（日志: {log_path}）")
+
+        try:
+            report['steps'] = run_levels(url, process, corpus, mode, levels, args)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+        report['url'] = url
+        report['workers'] = args.workers if args.server == 'gunicorn' else None
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+if __name__ == '__main__':
+    main()
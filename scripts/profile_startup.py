@@ -0,0 +1,153 @@
+"""
+启动耗时分析
+在全新的Python进程中启动V2应用，统计导入、加载人脸检测器、加载模型和预热各阶段的耗时，
+以及启动后第一个请求与之后请求的延迟对比；可选列出导入最慢的模块
+
+设置了 --budget 时作为启动耗时检查：启动总耗时（导入 + create_app）超出预算时以非0状态退出，
+可以放在CI或部署流程中，防止新实例的扩容速度退化
+
+用法（在项目根目录运行）:
+    python scripts/profile_startup.py --imports 15
+    python scripts/profile_startup.py --budget 10 --first-request-budget 500
+    python scripts/profile_startup.py --compare-warmup
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure():
+    """子进程：启动应用并测量各阶段耗时，结果以JSON输出到最后一行"""
+    started = time.perf_counter()
+    sys.path.insert(0, PROJECT_ROOT)
+    import recognition_app_v2 as app
+    import_seconds = time.perf_counter() - started
+
+    app.create_app()
+    startup_seconds = time.perf_counter() - started
+
+    import numpy as np
+    from PIL import Image
+
+    # 平滑的随机图片（每次内容不同，不会命中结果缓存；纯噪声会产生大量误检，掩盖模型本身的延迟）
+    rng = np.random.default_rng(0)
+    client = app.app.test_client()
+    latencies = []
+    for _ in range(6):
+        buffer = io.BytesIO()
+        small = (rng.random((12, 16, 3)) * 255).astype(np.uint8)
+        Image.fromarray(small).resize((640, 480), Image.BILINEAR).save(buffer, 'JPEG')
+        request_started = time.perf_counter()
+        response = client.post('/api/recognize', data={'image': (io.BytesIO(buffer.getvalue()), 'a.jpg')})
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"识别请求失败: {response.get_json()}")
+
+    result = {
+        'import_seconds': import_seconds,
+        'startup_seconds': startup_seconds,
+        'phases': app.startup_timings,
+        'first_request_ms': latencies[0],
+        'steady_request_ms': sorted(latencies[1:])[len(latencies[1:]) // 2],
+        'warmup_batch_sizes': app.WARMUP_BATCH_SIZES,
+        'torchvision_imported': 'torchvision' in sys.modules
+    }
+    print(json.dumps(result))
+
+def run_child(extra_env=None):
+    """在全新的进程中测量（避免已导入的模块和已初始化的运行时影响结果）"""
+    env = dict(os.environ, PGR_CACHE_SIZE='0', PGR_NEAR_DUPLICATE_SIZE='0')
+    env.update(extra_env or {})
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(count):
+    """用 python -X importtime 找出导入最慢的顶层模块"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import recognition_app_v2'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stderr
+
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 只统计被 recognition_app_v2 直接导入的模块（缩进最少的一层）
+        if name.startswith('   ') and not name.startswith('    '):
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+def print_result(title, result):
+    print("=" * 60)
+    print(title)
+    print("=" * 60)
+    print(f"导入:       {result['import_seconds']:.2f} 秒"
+          f"（torchvision{'已' if result['torchvision_imported'] else '未'}导入）")
+    for name, seconds in result['phases'].items():
+        if name != 'import':
+            print(f"  {name:16s} {seconds:.2f} 秒")
+    print(f"启动总耗时: {result['startup_seconds']:.2f} 秒")
+    print(f"第一个请求: {result['first_request_ms']:.0f} ms, 之后的请求: {result['steady_request_ms']:.0f} ms"
+          f"（预热批次: {result['warmup_batch_sizes'] or '无'}）")
+
+def main():
+    parser = argparse.ArgumentParser(description='V2应用启动耗时分析')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--imports', type=int, default=0, help='列出导入最慢的N个模块')
+    parser.add_argument('--compare-warmup', action='store_true', help='同时测量不预热时的结果')
+    parser.add_argument('--budget', type=float, help='启动总耗时上限（秒），超出时以非0状态退出')
+    parser.add_argument('--first-request-budget', type=float,
+                        help='第一个请求的延迟上限（毫秒），超出时以非0状态退出')
+    parser.add_argument('--output', help='结果保存为JSON文件')
+    args = parser.parse_args()
+
+    if args.child:
+        measure()
+        return
+
+    results = {'default': run_child()}
+    print_result("启动耗时（当前配置）", results['default'])
+
+    if args.compare_warmup:
+        results['no_warmup'] = run_child({'PGR_WARMUP_BATCH_SIZES': ''})
+        print_result("启动耗时（不预热）", results['no_warmup'])
+
+    if args.imports > 0:
+        print("=" * 60)
+        print("导入最慢的模块")
+        print("=" * 60)
+        for seconds, name in slowest_imports(args.imports):
+            print(f"{seconds:8.3f} 秒  {name}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    # 启动耗时检查
+    failures = []
+    result = results['default']
+    if args.budget is not None and result['startup_seconds'] > args.budget:
+        failures.append(f"启动总耗时 {result['startup_seconds']:.2f} 秒，超出预算 {args.budget} 秒")
+    if args.first_request_budget is not None and result['first_request_ms'] > args.first_request_budget:
+        failures.append(f"第一个请求 {result['first_request_ms']:.0f} ms，超出预算 {args.first_request_budget} ms")
+
+    print("=" * 60)
+    if failures:
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+    if args.budget is not None or args.first_request_budget is not None:
+        print("✓ 启动耗时在预算之内")
+
+if __name__ == '__main__':
+    main()
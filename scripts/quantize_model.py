@@ -0,0 +1,273 @@
+"""
+ResNet18分类模型的训练后INT8静态量化
+流程: 层融合(Conv+BN+ReLU) -> 在 classification_dataset/val 上校准 -> 转换为INT8 -> 导出TorchScript
+
+同时输出每个类别的准确率变化、CPU延迟、模型文件大小和运行时内存对比，结果保存到 models/quantization_report.json
+准确率在未参与校准的图片上评估：有 classification_dataset/test 时使用测试集，
+否则把验证集按类别分成两部分，一部分用于校准，另一部分用于评估（--calibration-fraction）
+量化后的模型可以通过 PGR_BACKEND=int8 在Web应用中使用（仅CPU）
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import argparse
+import subprocess
+import tempfile
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Subset
+from torchvision import datasets
+from torchvision.models import quantization as quantized_models
+
+# 从项目根目录导入训练脚本中的预处理
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train_classification_model import data_transforms
+
+VAL_DIR = os.path.join("classification_dataset", "val")
+TEST_DIR = os.path.join("classification_dataset", "test")
+MODELS_DIR = "models"
+MODEL_PATH = os.path.join(MODELS_DIR, "best_model.pth")
+QUANTIZED_PATH = os.path.join(MODELS_DIR, "best_model_int8.torchscript.pt")
+REPORT_PATH = os.path.join(MODELS_DIR, "quantization_report.json")
+
+def build_quantizable_model(num_classes):
+    """构建带量化桩的ResNet18并加载训练好的权重"""
+    model = quantized_models.resnet18(weights=None, quantize=False)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    model.load_state_dict(torch.load(MODEL_PATH, map_location='cpu', weights_only=True))
+    model.eval()
+    return model
+
+def split_by_class(dataset, fraction, seed=0):
+    """
+    按类别把数据集分成两部分（每个类别随机取 fraction 的图片放入第一部分，至少各留1张给第二部分）
+    返回: (第一部分的序号, 第二部分的序号)
+    """
+    by_class = {}
+    for idx, (_, label) in enumerate(dataset.samples):
+        by_class.setdefault(label, []).append(idx)
+
+    rng = random.Random(seed)
+    first, second = [], []
+    for label in sorted(by_class):
+        indices = by_class[label]
+        rng.shuffle(indices)
+        count = min(len(indices) - 1, max(1, round(len(indices) * fraction))) if len(indices) > 1 else 0
+        first.extend(indices[:count])
+        second.extend(indices[count:])
+    return sorted(first), sorted(second)
+
+def quantize(model, dataloader, calibration_batches):
+    """融合、校准并转换为INT8模型"""
+    engine = torch.backends.quantized.engine
+    print(f"量化引擎: {engine}")
+
+    model.fuse_model(is_qat=False)
+    model.qconfig = torch.ao.quantization.get_default_qconfig(engine)
+    torch.ao.quantization.prepare(model, inplace=True)
+
+    # 校准：统计各层激活值的范围
+    with torch.no_grad():
+        for i, (inputs, _) in enumerate(dataloader):
+            if i >= calibration_batches:
+                break
+            model(inputs)
+    print(f"✓ 校准完成: {min(calibration_batches, len(dataloader))} 个批次")
+
+    torch.ao.quantization.convert(model, inplace=True)
+    return model
+
+def evaluate(model, dataloader, num_classes):
+    """计算每个类别的准确率"""
+    correct = torch.zeros(num_classes)
+    total = torch.zeros(num_classes)
+
+    with torch.no_grad():
+        for inputs, labels in dataloader:
+            preds = model(inputs).argmax(dim=1)
+            for label, pred in zip(labels, preds):
+                total[label] += 1
+                correct[label] += int(pred == label)
+
+    per_class = (correct / total.clamp(min=1)).tolist()
+    overall = (correct.sum() / total.sum()).item()
+    return overall, per_class
+
+def measure_latency(model, batch_size, repeat):
+    """返回单次前向传播的平均耗时（毫秒）"""
+    inputs = torch.randn(batch_size, 3, 224, 224)
+    with torch.no_grad():
+        model(inputs)  # 预热
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model(inputs)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def rss_mb():
+    """当前进程的常驻内存和峰值（MB），从 /proc/self/status 读取"""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                name, value = line.split(':')
+                values[name] = int(value.split()[0]) / 1024
+    return values['VmRSS'], values['VmHWM']
+
+def measure_memory_child(path, batch_size):
+    """子进程：加载模型并做一次前向传播，输出各阶段相对加载前的内存增量（JSON，最后一行）"""
+    torch.set_num_threads(1)
+    torch.zeros(1) + 1  # 先完成torch自身的初始化，不计入模型的内存
+    base_rss, _ = rss_mb()
+
+    model = torch.jit.load(path, map_location='cpu')
+    model.eval()
+    loaded_rss, _ = rss_mb()
+
+    with torch.no_grad():
+        model(torch.randn(batch_size, 3, 224, 224))
+    forward_rss, peak_rss = rss_mb()
+
+    print(json.dumps({
+        'after_load_mb': loaded_rss - base_rss,
+        'after_forward_mb': forward_rss - base_rss,
+        'peak_mb': peak_rss - base_rss
+    }))
+
+def measure_memory(model, batch_size):
+    """在全新的进程中测量加载模型和一次前向传播带来的内存增量（同一进程中测量会被已分配的内存干扰）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.pt')
+        model.save(path)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure-memory', path, '--batch-size', str(batch_size)],
+            check=True, capture_output=True, text=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def serialized_size(model):
+    """模型序列化后的大小（MB）"""
+    buffer = io.BytesIO()
+    torch.jit.save(model, buffer)
+    return buffer.tell() / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='ResNet18训练后INT8量化')
+    parser.add_argument('--calibration-batches', type=int, default=32, help='校准使用的批次数')
+    parser.add_argument('--calibration-fraction', type=float, default=0.5,
+                        help='没有测试集时，验证集中用于校准的比例（其余用于评估准确率）')
+    parser.add_argument('--batch-size', type=int, default=16, help='校准和评估的批次大小')
+    parser.add_argument('--repeat', type=int, default=20, help='延迟测试重复次数')
+    parser.add_argument('--measure-memory', metavar='PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_memory:
+        measure_memory_child(args.measure_memory, args.batch_size)
+        return
+
+    print("=" * 60)
+    print("ResNet18 INT8 静态量化")
+    print("=" * 60)
+
+    if not os.path.exists(MODEL_PATH) or not os.path.isdir(VAL_DIR):
+        print(f"✗ 需要 {MODEL_PATH} 和 {VAL_DIR}")
+        sys.exit(1)
+
+    dataset = datasets.ImageFolder(VAL_DIR, data_transforms['val'])
+    class_names = dataset.classes
+    num_classes = len(class_names)
+    print(f"✓ 验证集: {len(dataset)} 张图片, {num_classes} 个类别")
+
+    # 校准和评估使用不同的图片，否则评估出的准确率变化偏乐观
+    if os.path.isdir(TEST_DIR):
+        calibration_set = dataset
+        evaluation_set = datasets.ImageFolder(TEST_DIR, data_transforms['val'])
+        if evaluation_set.classes != class_names:
+            print(f"✗ {TEST_DIR} 与 {VAL_DIR} 的类别不一致")
+            sys.exit(1)
+        evaluation_split = 'test'
+    else:
+        calibration_indices, evaluation_indices = split_by_class(dataset, args.calibration_fraction)
+        calibration_set = Subset(dataset, calibration_indices)
+        evaluation_set = Subset(dataset, evaluation_indices)
+        evaluation_split = 'val_holdout'
+    print(f"✓ 校准: {len(calibration_set)} 张, 评估（{evaluation_split}）: {len(evaluation_set)} 张")
+
+    calibration_loader = DataLoader(calibration_set, batch_size=args.batch_size, shuffle=False, num_workers=0)
+    evaluation_loader = DataLoader(evaluation_set, batch_size=args.batch_size, shuffle=False, num_workers=0)
+
+    # FP32基准模型（同样以TorchScript形式比较，保证公平）
+    example = torch.randn(1, 3, 224, 224)
+    fp32_model = build_quantizable_model(num_classes)
+    with torch.no_grad():
+        fp32_scripted = torch.jit.freeze(torch.jit.trace(fp32_model, example))
+
+    int8_model = quantize(build_quantizable_model(num_classes), calibration_loader, args.calibration_batches)
+    with torch.no_grad():
+        int8_scripted = torch.jit.freeze(torch.jit.trace(int8_model, example))
+    int8_scripted.save(QUANTIZED_PATH)
+    print(f"✓ INT8模型: {QUANTIZED_PATH}")
+
+    # 准确率对比
+    fp32_acc, fp32_per_class = evaluate(fp32_scripted, evaluation_loader, num_classes)
+    int8_acc, int8_per_class = evaluate(int8_scripted, evaluation_loader, num_classes)
+
+    print("\n" + "=" * 60)
+    print(f"{'类别':12s} {'FP32':>8s} {'INT8':>8s} {'变化':>8s}")
+    print("-" * 40)
+    per_class = {}
+    for name, fp32, int8 in zip(class_names, fp32_per_class, int8_per_class):
+        per_class[name] = {'fp32': fp32, 'int8': int8, 'delta': int8 - fp32}
+        print(f"{name:12s} {fp32:8.2%} {int8:8.2%} {int8 - fp32:+8.2%}")
+    print("-" * 40)
+    print(f"{'整体':12s} {fp32_acc:8.2%} {int8_acc:8.2%} {int8_acc - fp32_acc:+8.2%}")
+
+    # 延迟和大小对比
+    print("\n" + "=" * 60)
+    latency = {}
+    for batch_size in [1, 8]:
+        fp32_ms = measure_latency(fp32_scripted, batch_size, args.repeat)
+        int8_ms = measure_latency(int8_scripted, batch_size, args.repeat)
+        latency[f'batch_{batch_size}'] = {'fp32_ms': fp32_ms, 'int8_ms': int8_ms}
+        print(f"batch={batch_size}  FP32 {fp32_ms:8.1f} ms  INT8 {int8_ms:8.1f} ms  "
+              f"加速比 {fp32_ms / int8_ms:.2f}x")
+
+    fp32_mb = serialized_size(fp32_scripted)
+    int8_mb = serialized_size(int8_scripted)
+    print(f"模型大小  FP32 {fp32_mb:.1f} MB  INT8 {int8_mb:.1f} MB  "
+          f"减少 {1 - int8_mb / fp32_mb:.0%}")
+
+    # 运行时内存：加载模型后和一次前向传播后的常驻内存增量，以及前向传播中的峰值
+    memory = {}
+    for batch_size in [1, 8]:
+        fp32_memory = measure_memory(fp32_scripted, batch_size)
+        int8_memory = measure_memory(int8_scripted, batch_size)
+        memory[f'batch_{batch_size}'] = {'fp32': fp32_memory, 'int8': int8_memory}
+        print(f"batch={batch_size}  内存增量 加载后/前向传播后/峰值  "
+              f"FP32 {fp32_memory['after_load_mb']:.0f}/{fp32_memory['after_forward_mb']:.0f}/"
+              f"{fp32_memory['peak_mb']:.0f} MB  "
+              f"INT8 {int8_memory['after_load_mb']:.0f}/{int8_memory['after_forward_mb']:.0f}/"
+              f"{int8_memory['peak_mb']:.0f} MB")
+
+    report = {
+        'engine': torch.backends.quantized.engine,
+        'calibration_batches': args.calibration_batches,
+        'calibration_images': len(calibration_set),
+        'evaluation_split': evaluation_split,
+        'evaluation_images': len(evaluation_set),
+        'accuracy': {'fp32': fp32_acc, 'int8': int8_acc, 'delta': int8_acc - fp32_acc},
+        'per_class_accuracy': per_class,
+        'latency': latency,
+        'model_size_mb': {'fp32': fp32_mb, 'int8': int8_mb},
+        'runtime_memory_mb': memory
+    }
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ 量化报告: {REPORT_PATH}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+视频 / 帧序列角色识别
+基于V2的 detect_faces 和分类模型，但不对每一帧都跑完整流程：
+
+- 每隔N帧（关键帧）做一次人脸检测，检测框按IoU关联到已有的轨迹
+- 关键帧之间用模板匹配跟踪每条轨迹的位置
+- 轨迹的区域与上次识别时变化不大时直接复用上次的识别结果，只有变化明显时才重新识别
+- 输出每条轨迹出现的时间段和识别出的角色（按置信度投票）
+
+用法（在项目根目录运行）:
+    python scripts/recognize_video.py gameplay.mp4 --every 10 --output tracks.json
+    python scripts/recognize_video.py frames_dir/ --fps 30
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+
+import numpy as np
+import cv2
+from PIL import Image
+
+# 从项目根目录导入V2应用
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recognition_app_v2 as app
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# 区域缩略图边长（用于判断区域是否明显变化）
+SIGNATURE_SIZE = 16
+# 模板匹配得分低于该值时认为跟丢，保持原位置
+MATCH_THRESHOLD = 0.5
+
+class Track:
+    """一条人脸轨迹"""
+
+    def __init__(self, track_id, box, frame_idx):
+        self.id = track_id
+        self.box = box                  # 原图坐标 (x, y, w, h)，已扩展
+        self.start_frame = frame_idx
+        self.end_frame = frame_idx
+        self.missed = 0                 # 连续未匹配的关键帧数
+        self.template = None            # 模板匹配用的灰度区域（工作分辨率）
+        self.signature = None           # 上次识别时的区域缩略图
+        self.votes = defaultdict(float)  # 类别 -> 累计识别置信度
+        self.classifications = 0
+
+def iter_frames(source, fps):
+    """
+    逐帧读取视频文件或图片目录
+    返回: (帧率, 生成器)，生成器产生RGB帧数组
+    """
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+
+        def frames():
+            for name in names:
+                with Image.open(os.path.join(source, name)) as image:
+                    yield np.asarray(image.convert('RGB'))
+        return fps, frames()
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"无法打开视频: {source}")
+    video_fps = capture.get(cv2.CAP_PROP_FPS) or fps
+
+    def frames():
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        finally:
+            capture.release()
+    return video_fps, frames()
+
+def box_iou(a, b):
+    """计算两个 (x, y, w, h) 框的IoU"""
+    x_left = max(a[0], b[0])
+    y_top = max(a[1], b[1])
+    x_right = min(a[0] + a[2], b[0] + b[2])
+    y_bottom = min(a[1] + a[3], b[1] + b[3])
+    if x_right <= x_left or y_bottom <= y_top:
+        return 0.0
+    intersection = (x_right - x_left) * (y_bottom - y_top)
+    return intersection / (a[2] * a[3] + b[2] * b[3] - intersection)
+
+def associate(tracks, regions, iou_threshold):
+    """
+    按IoU贪心关联轨迹和检测框
+    返回: (匹配列表 [(track, region)], 未匹配的检测框, 未匹配的轨迹)
+    """
+    pairs = []
+    for track in tracks:
+        for j, region in enumerate(regions):
+            iou = box_iou(track.box, region[:4])
+            if iou >= iou_threshold:
+                pairs.append((iou, track, j))
+    pairs.sort(key=lambda p: p[0], reverse=True)
+
+    matched = []
+    used_tracks = set()
+    used_regions = set()
+    for _, track, j in pairs:
+        if track.id in used_tracks or j in used_regions:
+            continue
+        used_tracks.add(track.id)
+        used_regions.add(j)
+        matched.append((track, regions[j]))
+
+    unmatched_regions = [r for j, r in enumerate(regions) if j not in used_regions]
+    unmatched_tracks = [t for t in tracks if t.id not in used_tracks]
+    return matched, unmatched_regions, unmatched_tracks
+
+def to_work(box, scale):
+    """原图坐标 -> 工作分辨率坐标"""
+    x, y, w, h = box
+    return (int(x * scale), int(y * scale), max(1, int(w * scale)), max(1, int(h * scale)))
+
+def crop_gray(gray, box):
+    x, y, w, h = box
+    return gray[y:y + h, x:x + w]
+
+def signature(gray, box):
+    """区域的灰度缩略图，用于判断区域内容是否明显变化"""
+    patch = crop_gray(gray, box)
+    if patch.size == 0:
+        return None
+    return cv2.resize(patch, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def follow(track, gray, scale, img_size):
+    """关键帧之间：在上一位置附近做模板匹配，更新轨迹位置，跟丢时返回False"""
+    if track.template is None:
+        return False
+
+    th, tw = track.template.shape
+    x, y, _, _ = to_work(track.box, scale)
+    margin_x, margin_y = tw // 2, th // 2
+    left = max(0, x - margin_x)
+    top = max(0, y - margin_y)
+    right = min(gray.shape[1], x + tw + margin_x)
+    bottom = min(gray.shape[0], y + th + margin_y)
+
+    window = gray[top:bottom, left:right]
+    if window.shape[0] < th or window.shape[1] < tw:
+        return False
+
+    scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+    _, best, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+    if best < MATCH_THRESHOLD:
+        return False
+
+    new_x = min(img_size[0] - track.box[2], max(0, int(round((left + best_x) / scale))))
+    new_y = min(img_size[1] - track.box[3], max(0, int(round((top + best_y) / scale))))
+    track.box = (new_x, new_y, track.box[2], track.box[3])
+    return True
+
+def track_summary(track, fps):
+    """轨迹的时间段和投票得到的角色"""
+    class_name = max(track.votes, key=track.votes.get) if track.votes else None
+    return {
+        'track_id': track.id,
+        'class_name': class_name,
+        'character': app.get_character_display_name(class_name) if class_name else None,
+        'confidence': track.votes[class_name] / track.classifications if class_name else 0.0,
+        'start_frame': track.start_frame,
+        'end_frame': track.end_frame,
+        'start_time': track.start_frame / fps,
+        'end_time': (track.end_frame + 1) / fps,
+        'classifications': track.classifications
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='视频 / 帧序列角色识别')
+    parser.add_argument('source', help='视频文件或帧图片目录')
+    parser.add_argument('--every', type=int, default=10, help='每隔多少帧做一次人脸检测')
+    parser.add_argument('--fps', type=float, default=30.0, help='帧目录的帧率（视频文件从文件中读取）')
+    parser.add_argument('--iou', type=float, default=0.3, help='检测框与轨迹关联的IoU阈值')
+    parser.add_argument('--max-missed', type=int, default=2,
+                        help='轨迹连续多少个关键帧未被检测到后结束')
+    parser.add_argument('--change-threshold', type=float, default=12.0,
+                        help='区域缩略图平均灰度变化超过该值时重新识别')
+    parser.add_argument('--min-frames', type=int, default=1, help='输出的轨迹最少持续帧数')
+    parser.add_argument('--output', help='输出JSON文件（默认打印到终端）')
+    args = parser.parse_args()
+
+    app.load_face_detector()
+    app.load_model()
+
+    fps, frames = iter_frames(args.source, args.fps)
+
+    active = []
+    finished = []
+    next_id = 1
+    frame_count = 0
+    keyframes = 0
+    reused = 0
+    classified = 0
+    start = time.time()
+
+    for frame_idx, frame in enumerate(frames):
+        frame_count += 1
+        img_size = (frame.shape[1], frame.shape[0])
+        scale = app.detection_scale(*img_size)
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, round(img_size[0] * scale)), max(1, round(img_size[1] * scale))),
+                              interpolation=cv2.INTER_AREA)
+
+        if frame_idx % args.every != 0:
+            # 非关键帧：只跟踪
+            for track in active:
+                if follow(track, gray, scale, img_size):
+                    track.end_frame = frame_idx
+            continue
+
+        # 关键帧：检测并关联
+        keyframes += 1
+        faces = app.detect_faces(Image.fromarray(frame), img_array=frame, fallback=False)
+        regions = [app.expand_bbox(x, y, w, h, img_size[0], img_size[1], expand_ratio=0.5) + (conf,)
+                   for x, y, w, h, conf in faces]
+
+        matched, new_regions, lost = associate(active, regions, args.iou)
+
+        for track in lost:
+            track.missed += 1
+            if track.missed > args.max_missed:
+                active.remove(track)
+                finished.append(track)
+            elif follow(track, gray, scale, img_size):
+                track.end_frame = frame_idx
+
+        for region in new_regions:
+            track = Track(next_id, region[:4], frame_idx)
+            next_id += 1
+            active.append(track)
+            matched.append((track, region))
+
+        # 区域变化明显（或新轨迹）时才重新识别
+        to_classify = []
+        for track, region in matched:
+            track.box = tuple(int(v) for v in region[:4])
+            track.end_frame = frame_idx
+            track.missed = 0
+            work_box = to_work(track.box, scale)
+            track.template = crop_gray(gray, work_box).copy()
+
+            sig = signature(gray, work_box)
+            if (track.signature is None or sig is None
+                    or np.abs(sig - track.signature).mean() > args.change_threshold):
+                to_classify.append((track, sig))
+            else:
+                reused += 1
+
+        if to_classify:
+            batch = app.preprocess_regions(frame, [track.box for track, _ in to_classify])
+            results = app.classify_regions(batch, top_k=1)
+            for (track, sig), result in zip(to_classify, results):
+                best = result[0]
+                track.votes[best['class_name']] += best['confidence']
+                track.classifications += 1
+                track.signature = sig
+            classified += len(to_classify)
+
+    finished.extend(active)
+    elapsed = time.time() - start
+
+    tracks = [track_summary(t, fps) for t in sorted(finished, key=lambda t: t.start_frame)
+              if t.end_frame - t.start_frame + 1 >= args.min_frames and t.classifications > 0]
+
+    result = {
+        'source': args.source,
+        'fps': fps,
+        'frames': frame_count,
+        'keyframes': keyframes,
+        'classified_regions': classified,
+        'reused_regions': reused,
+        'tracks': tracks
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print("=" * 60)
+    print(f"帧数: {frame_count}, 关键帧: {keyframes}, 用时 {elapsed:.1f} 秒（{frame_count / max(elapsed, 1e-9):.1f} 帧/秒）")
+    print(f"识别区域: {classified}, 复用结果: {reused}")
+    print("=" * 60)
+    for track in tracks:
+        print(f"#{track['track_id']:3d} {track['character'] or '-':8s} "
+              f"{track['start_time']:8.2f}s - {track['end_time']:8.2f}s  置信度 {track['confidence']:.2f}")
+    if not args.output:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
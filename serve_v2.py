@@ -0,0 +1,121 @@
+"""
+战双角色识别系统 V2 - 生产环境启动入口
+使用gunicorn多进程部署：模型和人脸检测器在主进程中加载一次，
+fork出的worker以写时复制方式共享权重，不再各自加载 best_model.pth
+
+用法:
+    python serve_v2.py --workers 4 --threads 2 --bind 0.0.0.0:5000
+
+也可以通过环境变量配置: PGR_BIND, PGR_WORKERS, PGR_THREADS, PGR_TIMEOUT
+
+每个worker启动后按分到的核数设置torch、OpenCV和BLAS的线程数（可用 PGR_TORCH_THREADS、
+PGR_OPENCV_THREADS、PGR_BLAS_THREADS 指定），设置 PGR_CPU_AFFINITY 后绑定到各自的CPU核
+
+各worker的运行指标写入 PGR_METRICS_DIR（默认为临时目录），/metrics 不论由哪个worker响应都输出所有worker的合计
+"""
+
+import os
+import gc
+import shutil
+import argparse
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+
+class RecognitionServer(BaseApplication):
+    """以预加载的Flask应用运行gunicorn"""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def parse_args():
+    """解析命令行参数（默认值来自环境变量）"""
+    parser = argparse.ArgumentParser(description='战双角色识别系统 V2 生产环境服务器')
+    parser.add_argument('--bind', default=os.environ.get('PGR_BIND', '0.0.0.0:5000'),
+                        help='监听地址')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PGR_WORKERS', 2)),
+                        help='worker进程数')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('PGR_THREADS', 1)),
+                        help='每个worker的线程数（大于1时使用gthread worker）')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('PGR_TIMEOUT', 120)),
+                        help='worker超时时间（秒）')
+    return parser.parse_args()
+
+
+def pre_fork(server, worker):
+    """在主进程中为即将启动的worker分配序号（worker重启后沿用空出的序号，决定其绑定的CPU核）"""
+    used = {getattr(w, 'pgr_slot', None) for w in server.WORKERS.values()}
+    worker.pgr_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    """worker启动后设置线程数和CPU绑定，预热模型，并开始检查模型文件（开启热更新时，只在worker中轮询）"""
+    import recognition_app_v2
+
+    threads = recognition_app_v2.init_worker(worker.pgr_slot, server.cfg.workers)
+    server.log.info(
+        "worker %s (pid %s): torch线程数 %s, OpenCV线程数 %s, 绑定CPU核 %s",
+        worker.pgr_slot, worker.pid, threads['torch_threads'], threads['opencv_threads'],
+        threads['cpus'] if threads['cpus'] is not None else '无'
+    )
+
+
+def main():
+    args = parse_args()
+
+    # BLAS线程数只能在导入numpy/torch之前设置，默认按每个worker分到的核数
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    os.environ.setdefault('PGR_BLAS_THREADS', str(max(1, cpus // args.workers)))
+
+    # 各worker的指标写入同一目录，响应 /metrics 的worker合并所有worker的结果（清除上次运行留下的文件）
+    from metrics import clear_directory
+    created_metrics_dir = not os.environ.get('PGR_METRICS_DIR')
+    if created_metrics_dir:
+        os.environ['PGR_METRICS_DIR'] = tempfile.mkdtemp(prefix='pgr-metrics-')
+    metrics_dir = os.environ['PGR_METRICS_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    clear_directory(metrics_dir)
+    import recognition_app_v2
+
+    print("=" * 60)
+    print("战双角色识别系统 V2 - 生产环境")
+    print("=" * 60)
+
+    # 在主进程中加载模型，fork之后由各worker共享（预热在各worker中进行）
+    application = recognition_app_v2.create_app(preload=True)
+
+    # 把已加载的对象移出GC跟踪，避免worker中的垃圾回收触碰这些页面导致写时复制失效
+    gc.freeze()
+
+    print(f"监听地址: {args.bind}")
+    print(f"worker数: {args.workers}, 每个worker线程数: {args.threads}")
+    print(f"指标目录: {metrics_dir}")
+    print("=" * 60)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'preload_app': True,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+    }
+    if created_metrics_dir:
+        options['on_exit'] = lambda server: shutil.rmtree(metrics_dir, ignore_errors=True)
+    RecognitionServer(application, options).run()
+
+
+if __name__ == '__main__':
+    main()
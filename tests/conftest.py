@@ -0,0 +1,57 @@
+"""
+测试的公共设置
+在项目根目录运行: python -m pytest tests
+"""
+
+import os
+import sys
+import json
+import shutil
+
+import pytest
+import torch
+
+# 从项目根目录导入V2应用
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory):
+    """
+    包含随机权重模型的工作目录（models/ 下的文件与训练脚本导出的相同：
+    best_model.pth、TorchScript、ONNX 以及类别名称等元数据）
+    应用按相对路径读取 models/，使用时需要切换到该目录（见 app_in_model_dir）
+    """
+    import recognition_app_v2 as app
+    from train_classification_model import export_torchscript, export_onnx
+
+    root = tmp_path_factory.mktemp('app')
+    models_dir = root / 'models'
+    models_dir.mkdir()
+    for name in ['class_names.json', 'display_names.json', 'model_info.json']:
+        shutil.copy(os.path.join(PROJECT_ROOT, 'models', name), models_dir / name)
+
+    with open(models_dir / 'class_names.json', encoding='utf-8') as f:
+        num_classes = len(json.load(f))
+
+    torch.manual_seed(0)
+    model = app.build_model(num_classes).eval()
+    torch.save(model.state_dict(), models_dir / 'best_model.pth')
+    export_torchscript(model, str(models_dir / 'best_model.torchscript.pt'))
+    try:
+        export_onnx(model, str(models_dir / 'best_model.onnx'))
+    except ImportError:
+        pass
+    return root
+
+
+@pytest.fixture
+def app_in_model_dir(model_dir, monkeypatch):
+    """切换到 model_dir 后的V2应用模块（测试中修改的模块变量在结束后恢复）"""
+    import recognition_app_v2 as app
+
+    monkeypatch.chdir(model_dir)
+    monkeypatch.setattr(app, 'device', torch.device('cpu'))
+    monkeypatch.setattr(app, 'WARMUP_BATCH_SIZES', [])
+    return app
@@ -0,0 +1,112 @@
+"""
+异步版本识别接口对上传大小和请求头的检查
+识别本身替换为直接返回图片大小，不需要加载模型
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+
+from starlette.testclient import TestClient
+
+BOUNDARY = 'pgr-test-boundary'
+
+
+def multipart_body(image_bytes):
+    head = (
+        f'--{BOUNDARY}\r\n'
+        'Content-Disposition: form-data; name="image"; filename="a.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+    ).encode()
+    return head + image_bytes + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def chunked(body, size=64 * 1024):
+    """逐块产生请求体（没有Content-Length的分块上传）"""
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import asgi_app_v2
+    import recognition_app_v2
+
+    received = []
+
+    def fake_recognize(image_bytes):
+        received.append(len(image_bytes))
+        return {'success': True, 'size': len(image_bytes)}
+
+    monkeypatch.setattr(recognition_app_v2, 'recognize_image_bytes', fake_recognize)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(asgi_app_v2, 'executor', executor)
+    # 不进入lifespan（不加载模型）
+    client = TestClient(asgi_app_v2.app)
+    client.received = received
+    yield client
+    executor.shutdown()
+
+
+def post(client, body, headers=None):
+    headers = {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}', **(headers or {})}
+    return client.post('/api/recognize', content=body, headers=headers)
+
+
+def test_small_upload(client):
+    response = post(client, multipart_body(b'x' * 1000))
+    assert response.status_code == 200
+    assert response.json()['size'] == 1000
+
+
+def test_chunked_upload_within_limit(client):
+    response = post(client, chunked(multipart_body(b'x' * 100_000)))
+    assert response.status_code == 200
+    assert response.json()['size'] == 100_000
+
+
+def test_chunked_upload_over_limit_is_aborted(client):
+    """超过限制后停止接收，不会读完整个请求体（TestClient会先缓存请求体，这里直接调用ASGI应用）"""
+    import asgi_app_v2
+    import recognition_app_v2
+
+    chunks = list(chunked(multipart_body(b'x' * (recognition_app_v2.MAX_UPLOAD_SIZE * 3))))
+    consumed = 0
+    sent = []
+
+    async def receive():
+        nonlocal consumed
+        chunk = chunks.pop(0)
+        consumed += len(chunk)
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': '/api/recognize', 'query_string': b'',
+        'headers': [(b'content-type', f'multipart/form-data; boundary={BOUNDARY}'.encode())],
+    }
+    asyncio.run(asgi_app_v2.app(scope, receive, send))
+
+    assert sent[0]['status'] == 413
+    assert client.received == []
+    limit = recognition_app_v2.MAX_UPLOAD_SIZE + recognition_app_v2.MULTIPART_OVERHEAD
+    assert consumed <= limit + 64 * 1024
+
+
+def test_declared_length_over_limit(client):
+    import recognition_app_v2
+
+    length = recognition_app_v2.MAX_UPLOAD_SIZE + recognition_app_v2.MULTIPART_OVERHEAD + 1
+    response = post(client, b'', headers={'Content-Length': str(length)})
+    assert response.status_code == 413
+
+
+def test_malformed_content_length(client):
+    response = post(client, b'', headers={'Content-Length': 'abc'})
+    assert response.status_code == 400
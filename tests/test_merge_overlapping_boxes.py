@@ -0,0 +1,82 @@
+"""
+向量化的 merge_overlapping_boxes 与原逐对计算IoU的实现在随机输入上结果完全一致
+"""
+
+import numpy as np
+import pytest
+
+import recognition_app_v2 as app
+
+
+def merge_overlapping_boxes_reference(boxes, iou_threshold=0.3):
+    """原逐对计算IoU的 O(n²) 实现，作为向量化版本的对照"""
+    if len(boxes) == 0:
+        return []
+
+    boxes = sorted(boxes, key=lambda x: x[4], reverse=True)
+
+    merged = []
+    used = [False] * len(boxes)
+
+    for i in range(len(boxes)):
+        if used[i]:
+            continue
+
+        x1, y1, w1, h1, conf1 = boxes[i]
+        merged.append(boxes[i])
+        used[i] = True
+
+        for j in range(i + 1, len(boxes)):
+            if used[j]:
+                continue
+
+            x2, y2, w2, h2, conf2 = boxes[j]
+
+            x_left = max(x1, x2)
+            y_top = max(y1, y2)
+            x_right = min(x1 + w1, x2 + w2)
+            y_bottom = min(y1 + h1, y2 + h2)
+
+            if x_right > x_left and y_bottom > y_top:
+                intersection = (x_right - x_left) * (y_bottom - y_top)
+                union = w1 * h1 + w2 * h2 - intersection
+                iou = intersection / union if union > 0 else 0
+
+                if iou > iou_threshold:
+                    used[j] = True
+
+    return merged
+
+
+def random_boxes(rng, n, width=1920, height=1080):
+    """随机检测框；置信度按检测框面积计算，与 detect_faces 一致，因此会出现并列值"""
+    boxes = []
+    for _ in range(n):
+        w = int(rng.integers(20, 300))
+        h = int(rng.integers(20, 300))
+        x = int(rng.integers(0, width - w))
+        y = int(rng.integers(0, height - h))
+        confidence = min(1.0, (w * h) / (width * height * 0.5))
+        boxes.append((x, y, w, h, confidence))
+    return boxes
+
+
+@pytest.mark.parametrize('iou_threshold', [0.1, 0.3, 0.5])
+def test_matches_reference_on_random_boxes(iou_threshold):
+    rng = np.random.default_rng(int(iou_threshold * 10))
+    for _ in range(100):
+        boxes = random_boxes(rng, int(rng.integers(0, 400)))
+        assert app.merge_overlapping_boxes(boxes, iou_threshold) == \
+            merge_overlapping_boxes_reference(boxes, iou_threshold)
+
+
+def test_matches_reference_on_clustered_boxes():
+    # 同一张脸附近的多个候选框（多轮级联检测的典型输出），大部分互相重叠
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        boxes = random_boxes(rng, int(rng.integers(1, 60)), width=400, height=400)
+        assert app.merge_overlapping_boxes(boxes) == merge_overlapping_boxes_reference(boxes)
+
+
+def test_empty_input():
+    assert app.merge_overlapping_boxes([]) == []
@@ -0,0 +1,81 @@
+"""
+多进程部署时的指标合并：各进程写入共享目录，任一进程输出所有进程的合计
+"""
+
+import os
+
+import pytest
+
+from metrics import MetricsRegistry, clear_directory
+
+
+def make_registry(directory, gauges):
+    registry = MetricsRegistry(str(directory))
+    requests_total = registry.counter('test_requests_total', '请求数', ['status'])
+    latency = registry.histogram('test_latency_seconds', '耗时', buckets=(0.1, 1.0))
+    registry.register_collector(lambda: [('test_queue_depth', 'gauge', '队列长度', [({}, gauges['depth'])])])
+    return registry, requests_total, latency
+
+
+def parse(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def run_in_child(func):
+    """在fork出的子进程中执行func，子进程退出后返回"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            func()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 os.fork')
+def test_render_merges_processes(tmp_path):
+    gauges = {'depth': 3}
+    registry, requests_total, latency = make_registry(tmp_path, gauges)
+
+    def worker():
+        requests_total.inc(2, status=200)
+        latency.observe(0.5)
+        registry.flush()
+
+    # 子进程写入的计数在其退出后仍计入合计，gauge只统计仍在运行的进程
+    run_in_child(worker)
+    requests_total.inc(status=200)
+    requests_total.inc(status=500)
+    latency.observe(0.05)
+
+    samples = parse(registry.render())
+    assert samples['test_requests_total{status="200"}'] == 3
+    assert samples['test_requests_total{status="500"}'] == 1
+    assert samples['test_latency_seconds_bucket{le="0.1"}'] == 1
+    assert samples['test_latency_seconds_bucket{le="1.0"}'] == 2
+    assert samples['test_latency_seconds_bucket{le="+Inf"}'] == 2
+    assert samples['test_latency_seconds_count'] == 2
+    assert samples['test_latency_seconds_sum'] == pytest.approx(0.55)
+    assert samples['test_queue_depth'] == 3
+
+
+def test_render_without_directory(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter('test_total', '计数').inc()
+
+    assert parse(registry.render()) == {'test_total': 1}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_clear_directory(tmp_path):
+    registry, requests_total, _ = make_registry(tmp_path, {'depth': 0})
+    requests_total.inc(status=200)
+    registry.flush()
+
+    clear_directory(str(tmp_path))
+    assert list(tmp_path.glob('metrics_*.json')) == []
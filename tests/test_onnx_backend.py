@@ -0,0 +1,67 @@
+"""
+ONNX Runtime后端与PyTorch后端（TorchScript）在样本裁剪图上的输出一致
+延迟对比见 scripts/compare_backends.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+pytest.importorskip('onnxruntime')
+
+
+@pytest.fixture
+def app(app_in_model_dir):
+    if not os.path.exists(app_in_model_dir.ONNX_MODEL_PATH):
+        pytest.skip('未安装onnx，无法导出ONNX模型')
+    return app_in_model_dir
+
+
+def sample_batch(count):
+    """不同尺寸的平滑随机图片（模拟检测出的人脸区域），预处理成批次张量"""
+    import recognition_app_v2 as app
+
+    rng = np.random.default_rng(0)
+    tensors = []
+    for _ in range(count):
+        h, w = rng.integers(64, 400, size=2)
+        small = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        crop = np.asarray(Image.fromarray(small).resize((int(w), int(h)), Image.BILINEAR))
+        tensors.append(app.preprocess_regions(crop, [(0, 0, int(w), int(h))]))
+    return torch.cat(tensors)
+
+
+def load_backend(app, monkeypatch, name):
+    monkeypatch.setattr(app, 'INFERENCE_BACKEND', name)
+    return app.load_model_version()
+
+
+def test_probabilities_match(app, monkeypatch):
+    batch = sample_batch(32)
+
+    probs = {}
+    for name in ['torch', 'onnx']:
+        loaded = load_backend(app, monkeypatch, name)
+        with torch.no_grad():
+            probs[name] = torch.softmax(loaded.model(batch), dim=1)
+
+    assert (probs['torch'] - probs['onnx']).abs().max().item() < 1e-4
+    assert torch.equal(probs['torch'].argmax(1), probs['onnx'].argmax(1))
+
+
+def test_top5_results_match(app, monkeypatch):
+    """经过 predict_tensor 的后处理后，两个后端返回的Top-5类别和置信度一致"""
+    batch = sample_batch(8)
+
+    results = {}
+    for name in ['torch', 'onnx']:
+        loaded = load_backend(app, monkeypatch, name)
+        results[name] = app.predict_tensor(batch, top_k=5, loaded=loaded)
+
+    for torch_result, onnx_result in zip(results['torch'], results['onnx']):
+        assert [r['class_name'] for r in torch_result] == [r['class_name'] for r in onnx_result]
+        for a, b in zip(torch_result, onnx_result):
+            assert a['confidence'] == pytest.approx(b['confidence'], abs=1e-4)
@@ -0,0 +1,95 @@
+"""
+启动耗时检查，以及gunicorn预加载方式（主进程加载模型后fork出worker）下worker能正常推理
+各项都在全新的子进程中运行
+"""
+
+import os
+import sys
+import json
+import signal
+import subprocess
+
+import pytest
+
+from conftest import PROJECT_ROOT
+
+# 启动总耗时（导入 + create_app，秒）和启动后第一个请求延迟（毫秒）的上限，可按机器性能调整
+STARTUP_BUDGET = float(os.environ.get('PGR_STARTUP_BUDGET', 30))
+FIRST_REQUEST_BUDGET_MS = float(os.environ.get('PGR_FIRST_REQUEST_BUDGET_MS', 3000))
+
+# 主进程预加载后fork，worker中预热并识别一张图片
+FORK_SCRIPT = '''
+import os
+import sys
+from PIL import Image
+import recognition_app_v2 as app
+
+app.create_app(preload=True)
+pid = os.fork()
+if pid == 0:
+    app.init_worker(0, 1)
+    app.predict_with_face_detection(Image.new('RGB', (640, 480), (128, 128, 128)))
+    os._exit(0)
+_, status = os.waitpid(pid, 0)
+sys.exit(os.waitstatus_to_exitcode(status))
+'''
+
+# 预加载的主进程保持单线程，不绑定CPU核
+PRELOAD_SCRIPT = '''
+import os
+import json
+import cv2
+import torch
+import recognition_app_v2 as app
+
+affinity = sorted(os.sched_getaffinity(0))
+app.create_app(preload=True)
+print(json.dumps({
+    'affinity_changed': sorted(os.sched_getaffinity(0)) != affinity,
+    'torch_threads': torch.get_num_threads(),
+    'opencv_threads': cv2.getNumThreads(),
+}))
+'''
+
+
+def test_startup_budget(model_dir, monkeypatch):
+    from scripts.profile_startup import run_child
+
+    monkeypatch.chdir(model_dir)
+    result = run_child()
+
+    assert result['startup_seconds'] < STARTUP_BUDGET
+    assert result['first_request_ms'] < FIRST_REQUEST_BUDGET_MS
+    # 有导出的TorchScript模型时不需要导入torchvision
+    assert not result['torchvision_imported']
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 os.fork')
+def test_worker_after_preload_fork(model_dir):
+    """主进程在fork之前用多个线程执行过前向传播时，worker中的推理会卡死"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, PGR_TORCH_THREADS='2', PGR_OPENCV_THREADS='2',
+               PGR_WARMUP_BATCH_SIZES='1,4', PGR_CACHE_SIZE='0')
+    process = subprocess.Popen(
+        [sys.executable, '-c', FORK_SCRIPT], cwd=model_dir, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, start_new_session=True
+    )
+    try:
+        output, _ = process.communicate(timeout=120)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        output, _ = process.communicate()
+        pytest.fail(f'fork之后worker中的推理没有完成:\n{output}')
+    assert process.returncode == 0, output
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason='需要 os.sched_getaffinity')
+def test_preload_master_stays_single_threaded(model_dir):
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, PGR_TORCH_THREADS='4', PGR_OPENCV_THREADS='4',
+               PGR_CPU_AFFINITY='0', PGR_CACHE_SIZE='0')
+    output = subprocess.run(
+        [sys.executable, '-c', PRELOAD_SCRIPT], cwd=model_dir, env=env,
+        capture_output=True, text=True, check=True, timeout=120
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result == {'affinity_changed': False, 'torch_threads': 1, 'opencv_threads': 1}
@@ -203,6 +203,39 @@ def train_model(model, criterion, optimizer, scheduler, dataloaders, dataset_siz
     model.load_state_dict(best_model_wts)
     return model, history, best_acc
 
+def export_torchscript(model, path):
+    """
+    导出用于推理的TorchScript模型（trace + freeze）
+    Web应用检测到该文件时直接加载，不再重建网络结构，也不依赖pickle
+    """
+    model = copy.deepcopy(model).cpu().eval()
+    example = torch.randn(1, 3, config['input_size'], config['input_size'])
+    
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced)
+    
+    frozen.save(path)
+
+def export_onnx(model, path):
+    """
+    导出ONNX模型（批次维度可变），供Web应用的ONNX Runtime后端使用
+    需要安装 onnx，且 PyTorch >= 2.5
+    """
+    model = copy.deepcopy(model).cpu().eval()
+    example = torch.randn(1, 3, config['input_size'], config['input_size'])
+    
+    torch.onnx.export(
+        model,
+        (example,),
+        path,
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=17,
+        dynamo=False
+    )
+
 def save_model(model, class_names, history, best_acc):
     """保存模型和相关信息"""
     print("\n" + "=" * 60)
@@ -219,6 +252,19 @@ def save_model(model, class_names, history, best_acc):
     torch.save(model, full_model_path)
     print(f"✓ 完整模型: {full_model_path}")
     
+    # 导出TorchScript推理模型
+    torchscript_path = os.path.join(config['save_dir'], 'best_model.torchscript.pt')
+    export_torchscript(model, torchscript_path)
+    print(f"✓ TorchScript模型: {torchscript_path}")
+    
+    # 导出ONNX模型（可选依赖，未安装onnx时跳过）
+    onnx_path = os.path.join(config['save_dir'], 'best_model.onnx')
+    try:
+        export_onnx(model, onnx_path)
+        print(f"✓ ONNX模型: {onnx_path}")
+    except ImportError as e:
+        print(f"  跳过ONNX导出（{e}）")
+    
     # 保存类别名称
     class_names_path = os.path.join(config['save_dir'], 'class_names.json')
     with open(class_names_path, 'w', encoding='utf-8') as f: